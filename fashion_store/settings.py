@@ -25,6 +25,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.guest_cart.GuestCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,6 +55,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Blocks that read and then write take the write lock up front through
+        # store.locking.write_transaction; other transactions stay deferred
     }
 }
 
@@ -77,15 +80,67 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# LocMemCache is private to each process: with several workers, cart badges and
+# cached pages are only refreshed in the one that saw the change, so their
+# timeouts are capped (see store.shared_cache). Use Redis or Memcached there.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'closetverse',
+    }
+}
+
+# Seconds an anonymous catalog page stays in the full-page cache
+PAGE_CACHE_TIMEOUT = 600
+
+# Products created within this many days are shown as new arrivals
+NEW_ARRIVAL_DAYS = 30
+
+# Where guests' carts live until they log in: 'db' (Cart rows keyed by
+# session), 'cache', or 'cookie' (signed, at most guest_cart.MAX_LINES lines)
+GUEST_CART_ENGINE = 'db'
+
+# Follow-up work after an order (recommendations, sales rollups) is queued in
+# the database and run by `manage.py run_tasks`, with retries. Set to False to
+# run it once, in a background thread of the web process, after the commit
+TASK_QUEUE_ASYNC = True
+
+# Minutes stock stays held for a cart after it opens checkout
+STOCK_RESERVATION_MINUTES = 15
+
+# Bearer tokens partners send to GET /export/catalog/ (staff can use it when
+# logged in); comma-separated in the environment so they stay out of the repo
+CATALOG_EXPORT_TOKENS = [token for token in os.environ.get('CATALOG_EXPORT_TOKENS', '').split(',') if token]
+
+# Guest carts and wishlists idle this long are removed by `purge_abandoned_carts`
+ABANDONED_CART_DAYS = 30
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# `collectstatic` fingerprints assets, writes .gz/.br siblings and the manifest
+# that {% static %} resolves through; store.assets.serve_static serves them
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'store.assets.CompressedManifestStaticFilesStorage',
+    },
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized product images are built by a background thread pool after upload
+IMAGE_PIPELINE_ASYNC = True
+IMAGE_PIPELINE_WORKERS = 2
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+LOGIN_URL = 'store:login'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
@@ -0,0 +1,105 @@
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fashion_store.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store import facets, search
+from store.models import Category, Product
+
+
+@contextmanager
+def scratch_database(on_disk=False):
+    """Run benchmarks against a throwaway database so db.sqlite3 is never touched"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    # 0001/0002 both create the cart tables, so build the schema from the models
+    test_settings['MIGRATE'] = False
+    tmpdir = None
+    if on_disk:
+        # Threaded benchmarks need a real file; shared-cache memory DBs lock per table
+        tmpdir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if on_disk:
+            test_settings['NAME'] = None
+            os.rmdir(tmpdir)
+        teardown_test_environment()
+
+
+def make_catalog(categories=10, products=1000, batch_size=5000):
+    """Bulk-create a synthetic catalog and bring derived data up to date"""
+    cats = Category.objects.bulk_create([
+        Category(name=f"Category {i}", slug=f"category-{i}", description=f"Synthetic category {i}")
+        for i in range(categories)
+    ])
+    sizes = ['XS,S,M', 'S,M,L', 'M,L,XL', 'L,XL,XXL', 'XS,S,M,L,XL,XXL']
+    batch = []
+    for i in range(products):
+        batch.append(Product(
+            name=f"Product {i}",
+            slug=f"product-{i}",
+            category=cats[i % categories],
+            description=f"Synthetic product {i} in a cotton blend",
+            price=Decimal(499 + (i * 37) % 20000),
+            sizes=sizes[i % len(sizes)],
+            featured=i % 50 == 0,
+            available=i % 10 != 0,
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+    Category.refresh_product_counts()
+    facets.rebuild()
+    if search.is_supported():
+        search.rebuild_index()
+    return cats
+
+
+def count_queries(fn):
+    """Run fn and return (result, number of queries it ran).
+
+    Uses an execute wrapper rather than CaptureQueriesContext, whose log is
+    cleared by the request_started signal when fn goes through the test client.
+    """
+    executed = []
+
+    def counter(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        result = fn()
+    return result, len(executed)
+
+
+def measure(fn, repeat=20):
+    """Return (median milliseconds, queries per call) for fn"""
+    _result, queries = count_queries(fn)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), queries
+
+
+def report(label, ms, queries):
+    print(f"  {label:<46} {ms:9.2f} ms  {queries:5d} queries")
@@ -0,0 +1,38 @@
+import sys
+
+from bench_utils import make_catalog, measure, report, scratch_database
+
+from django.test import Client
+
+from store.models import Category, Product
+
+
+def legacy_sidebar_counts():
+    """Sidebar counts as the listing pages used to compute them"""
+    total = Product.objects.filter(available=True).count()
+    return total, [category.products.count() for category in Category.objects.all()]
+
+
+def stored_sidebar_counts():
+    """Sidebar counts read from Category.product_count"""
+    categories = list(Category.objects.all())
+    return sum(c.product_count for c in categories), [c.product_count for c in categories]
+
+
+def run(categories, products):
+    print(f"\n{categories} categories / {products} products")
+    make_catalog(categories=categories, products=products)
+    report("sidebar counts (before: COUNT per category)", *measure(legacy_sidebar_counts))
+    report("sidebar counts (after: stored counts)", *measure(stored_sidebar_counts))
+
+    client = Client()
+    report("GET /products/", *measure(lambda: client.get('/products/'), repeat=10))
+    report("GET /category/category-0/", *measure(lambda: client.get('/category/category-0/'), repeat=10))
+
+
+if __name__ == "__main__":
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("CATEGORY COUNT BENCHMARK")
+    print("=" * 50)
+    with scratch_database():
+        run(categories=25, products=products)
@@ -0,0 +1,50 @@
+import sys
+
+from bench_utils import count_queries, make_catalog, scratch_database
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from store.models import Cart, CartItem, Order, Product
+
+SHIPPING = {'full_name': 'Load Test', 'address': '1 Bench Street', 'city': 'Pune', 'postal_code': '411001',
+            'phone': '0000000000', 'payment_method': 'UPI'}
+
+
+def checkout_queries(client, user, products):
+    """Queries run by one checkout POST for a cart holding one unit of each product"""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1, size='M') for product in products])
+    Cart.refresh_totals()
+    idempotency_key = client.get('/checkout/').context['idempotency_key']
+    response, queries = count_queries(
+        lambda: client.post('/checkout/', dict(SHIPPING, idempotency_key=idempotency_key))
+    )
+    assert response.status_code == 302 and response.url == '/order-success/', "checkout did not place the order"
+    order = Order.objects.latest('pk')
+    assert order.items.count() == len(products), "order lines do not match the cart"
+    return queries
+
+
+def run(line_counts):
+    make_catalog(categories=2, products=max(line_counts) * 2)
+    products = list(Product.objects.filter(available=True).order_by('pk'))
+    user = User.objects.create_user('buyer', password='x')
+    client = Client()
+    client.force_login(user)
+
+    counts = {}
+    for lines in line_counts:
+        counts[lines] = checkout_queries(client, user, products[:lines])
+        print(f"  {lines:>5} lines: {counts[lines]} queries")
+
+    assert len(set(counts.values())) == 1, f"query count grows with the cart: {counts}"
+    print("  constant query count")
+
+
+if __name__ == "__main__":
+    line_counts = [int(arg) for arg in sys.argv[1:]] or [1, 10, 200, 1000]
+    print("CHECKOUT QUERY COUNT BENCHMARK")
+    print("=" * 50)
+    with scratch_database():
+        run(line_counts)
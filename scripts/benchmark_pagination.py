@@ -0,0 +1,58 @@
+import sys
+
+from bench_utils import make_catalog, measure, report, scratch_database
+
+from django.core.paginator import Paginator
+from django.test import Client
+
+from store.models import Product
+from store.pagination import KeysetPaginator, encode_cursor
+
+PER_PAGE = 12
+
+
+def offset_page(number):
+    """Listing page as Django's OFFSET paginator builds it, including its COUNT"""
+    queryset = Product.objects.filter(available=True).order_by('-created_at', '-id')
+    return list(Paginator(queryset, PER_PAGE).page(number).object_list)
+
+
+def keyset_cursor_for(number):
+    """Cursor that lands on page `number`, as the Next links would have built it"""
+    if number == 1:
+        return None
+    queryset = Product.objects.filter(available=True).order_by('-created_at', '-id')
+    anchor = queryset[(number - 1) * PER_PAGE - 1]
+    return encode_cursor({'d': 'next', 't': anchor.created_at.isoformat(), 'id': anchor.pk, 'n': number})
+
+
+def keyset_page(cursor, count):
+    queryset = Product.objects.filter(available=True)
+    return list(KeysetPaginator(queryset, PER_PAGE, count=count).page(cursor).object_list)
+
+
+def run(products, deep_page):
+    print(f"\n{products} products, page 1 vs page {deep_page}")
+    make_catalog(categories=20, products=products)
+    count = Product.objects.filter(available=True).count()
+
+    for number in (1, deep_page):
+        report(f"OFFSET paginator page {number}", *measure(lambda: offset_page(number), repeat=10))
+    for number in (1, deep_page):
+        cursor = keyset_cursor_for(number)
+        assert keyset_page(cursor, count) == offset_page(number)
+        report(f"keyset paginator page {number}", *measure(lambda: keyset_page(cursor, count), repeat=10))
+
+    client = Client()
+    cursor = keyset_cursor_for(deep_page)
+    report(f"GET /products/?page={deep_page}", *measure(lambda: client.get(f'/products/?page={deep_page}'), repeat=5))
+    report(f"GET /products/?cursor=<page {deep_page}>", *measure(lambda: client.get(f'/products/?cursor={cursor}'), repeat=5))
+
+
+if __name__ == "__main__":
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    deep_page = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    print("PAGINATION BENCHMARK")
+    print("=" * 50)
+    with scratch_database():
+        run(products, deep_page)
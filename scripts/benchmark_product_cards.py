@@ -0,0 +1,48 @@
+import sys
+
+from bench_utils import make_catalog, measure, report, scratch_database
+
+from django.core.cache import cache
+from django.test import Client
+
+from store.cards import render_product_cards
+from store.models import Product
+
+PER_PAGE = 12
+
+
+def page_products():
+    return list(Product.objects.filter(available=True).select_related('category')[:PER_PAGE])
+
+
+def cold_cards(products):
+    """Every card rendered from the template, as each request used to do"""
+    cache.clear()
+    return render_product_cards(products)
+
+
+def run(products):
+    print(f"\n{products} products, {PER_PAGE} cards per page")
+    make_catalog(categories=10, products=products)
+    page = page_products()
+
+    report("render 12 cards (cold cache)", *measure(lambda: cold_cards(page)))
+    render_product_cards(page)
+    report("render 12 cards (warm cache)", *measure(lambda: render_product_cards(page)))
+
+    # Logged-in requests bypass the page cache, so they show the card cache on its own
+    from django.contrib.auth.models import User
+    User.objects.create_user('bench', password='bench')
+    client = Client()
+    client.login(username='bench', password='bench')
+    report("GET /products/ (cold card cache)", *measure(lambda: (cache.clear(), client.get('/products/')), repeat=10))
+    client.get('/products/')
+    report("GET /products/ (warm card cache)", *measure(lambda: client.get('/products/'), repeat=10))
+
+
+if __name__ == "__main__":
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print("PRODUCT CARD RENDER BENCHMARK")
+    print("=" * 50)
+    with scratch_database():
+        run(products)
@@ -0,0 +1,80 @@
+import random
+import sys
+import time
+from decimal import Decimal
+
+from bench_utils import make_catalog, measure, report, scratch_database
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from store import recommendations
+from store.models import Order, OrderItem, Product, Wishlist, WishlistItem
+
+
+def make_orders(orders, lines_per_order=5, batch_size=20000):
+    """Bulk-create orders whose baskets cluster around neighbouring product ids"""
+    user, _created = User.objects.get_or_create(username='bench-buyer')
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    rng = random.Random(42)
+    first = Order.objects.count()
+    Order.objects.bulk_create(
+        [Order(user=user, full_name='Bench', address='-', city='-', postal_code='-', phone='-',
+               payment_method='COD', total_price=Decimal('0')) for _ in range(orders)],
+        batch_size=batch_size,
+    )
+    order_ids = list(Order.objects.order_by('pk').values_list('pk', flat=True)[first:])
+    batch = []
+    for order_id in order_ids:
+        anchor = rng.randrange(len(product_ids))
+        for offset in rng.sample(range(-20, 20), lines_per_order):
+            batch.append(OrderItem(order_id=order_id, product_id=product_ids[(anchor + offset) % len(product_ids)],
+                                   quantity=1, total=Decimal('0')))
+        if len(batch) >= batch_size:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        OrderItem.objects.bulk_create(batch)
+
+
+def make_wishlists(wishlists, items=4):
+    product_ids = list(Product.objects.values_list('pk', flat=True))
+    rng = random.Random(7)
+    offset = Wishlist.objects.count()
+    created = Wishlist.objects.bulk_create([Wishlist(session_key=f"bench-{offset + i}") for i in range(wishlists)])
+    WishlistItem.objects.bulk_create([
+        WishlistItem(wishlist=wishlist, product_id=pk)
+        for wishlist in created for pk in rng.sample(product_ids, items)
+    ])
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<46} {time.perf_counter() - start:9.2f} s   {result}")
+
+
+def run(products, orders):
+    print(f"\n{products} products / {orders} orders (~{orders * 5} order lines)")
+    make_catalog(categories=25, products=products)
+    make_orders(orders)
+    make_wishlists(orders // 10)
+
+    timed("full build", lambda: recommendations.build(full=True))
+    make_orders(orders // 100)
+    make_wishlists(orders // 1000)
+    timed("incremental build (+1% orders)", recommendations.build)
+
+    product = Product.objects.filter(available=True).order_by('pk')[products // 2]
+    report("recommended_products()", *measure(lambda: recommendations.recommended_products(product)))
+    client = Client()
+    report(f"GET /product/{product.slug}/", *measure(lambda: client.get(f'/product/{product.slug}/'), repeat=10))
+
+
+if __name__ == "__main__":
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    print("RECOMMENDATIONS BENCHMARK")
+    print("=" * 50)
+    with scratch_database():
+        run(products, orders)
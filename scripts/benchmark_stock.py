@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+
+from bench_utils import make_catalog, scratch_database
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from store import checkout, stock
+from store.models import Cart, CartItem, Order, OrderItem, Product, StockReservation
+
+SHIPPING = {'full_name': 'Load Test', 'address': '1 Bench Street', 'city': 'Pune', 'postal_code': '411001',
+            'phone': '0000000000', 'payment_method': 'UPI'}
+
+
+def shopper(user, product, attempts, results, barrier):
+    """Open checkout and place a one-unit order, over and over, until stock runs out"""
+    cart = Cart.objects.create(user=user)
+    placed = refused = 0
+    barrier.wait()
+    for attempt in range(attempts):
+        CartItem.objects.create(cart=cart, product=product, quantity=1, size='M')
+        try:
+            stock.reserve(cart, CartItem.objects.filter(cart=cart).select_related('product'))
+            checkout.place_order(user, cart, SHIPPING, f"{user.pk}-{attempt}")
+            placed += 1
+        except (stock.OutOfStock, checkout.CheckoutError):
+            refused += 1
+            CartItem.objects.filter(cart=cart).delete()
+    results.append((placed, refused))
+    connection.close()
+
+
+def run(threads, stock_units, attempts):
+    print(f"\n{threads} shoppers x {attempts} one-unit orders against one SKU with {stock_units} units")
+    make_catalog(categories=1, products=5)
+    product = Product.objects.filter(available=True).first()
+    Product.objects.filter(pk=product.pk).update(stock_quantity=stock_units)
+    users = [User.objects.create_user(f"buyer{i}", password='x') for i in range(threads)]
+
+    results = []
+    barrier = threading.Barrier(threads)
+    workers = [threading.Thread(target=shopper, args=(user, product, attempts, results, barrier)) for user in users]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    placed = sum(r[0] for r in results)
+    refused = sum(r[1] for r in results)
+    sold = sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+    left = Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+    print(f"  {placed} orders placed, {refused} refused in {elapsed:.2f}s ({placed / elapsed:.1f} orders/s)")
+    print(f"  units sold {sold}, stock left {left}, orders {Order.objects.count()}")
+
+    assert sold == placed == Order.objects.count(), "an order line does not match a placed order"
+    assert sold + left == stock_units, f"oversold by {sold + left - stock_units}" if sold + left > stock_units else "stock leaked"
+    assert placed == min(stock_units, threads * attempts), "stock was refused while units were available"
+    assert not StockReservation.objects.exists(), "placed orders left stock held"
+    print("  zero oversell")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    stock_units = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    attempts = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+    print("HOT SKU CHECKOUT BENCHMARK")
+    print("=" * 50)
+    with scratch_database(on_disk=True):
+        run(threads, stock_units, attempts)
@@ -0,0 +1,76 @@
+import statistics
+import sys
+import time
+from unittest import mock
+
+from bench_utils import count_queries, make_catalog, scratch_database
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from store.models import Cart, CartItem, Product
+
+PAGES = ['/', '/products/', '/category/category-0/', '/new-arrivals/', '/wishlist/']
+
+
+def legacy_cart_count(request):
+    """Badge count as every page used to compute it: find the cart, then sum its lines"""
+    if request.user.is_authenticated:
+        cart = Cart.objects.filter(user=request.user).first()
+    else:
+        session_key = request.session.session_key
+        cart = Cart.objects.filter(session_key=session_key).first() if session_key else None
+    return sum(item.quantity for item in cart.items.all()) if cart else 0
+
+
+def make_shoppers(count, lines=5):
+    """Logged-in clients that each have a cart with a few lines"""
+    product_ids = list(Product.objects.filter(available=True).values_list('pk', flat=True)[:50])
+    clients = []
+    for i in range(count):
+        user = User.objects.create_user(f"shopper{i}", password='x')
+        cart = Cart.objects.create(user=user)
+        for j in range(lines):
+            CartItem.objects.create(cart=cart, product_id=product_ids[(i + j) % len(product_ids)], quantity=1 + j % 3)
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+    return clients
+
+
+def run_load(label, clients, rounds):
+    timings, queries = [], []
+    for _ in range(rounds):
+        for client in clients:
+            for page in PAGES:
+                start = time.perf_counter()
+                response, executed = count_queries(lambda: client.get(page))
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(executed)
+                assert response.status_code == 200, (page, response.status_code)
+    total = sum(timings) / 1000
+    print(f"  {label:<34} {len(timings) / total:8.1f} req/s  {statistics.median(timings):7.2f} ms median"
+          f"  {sum(queries) / len(queries):6.2f} queries/request")
+
+
+def run(shoppers, rounds):
+    print(f"\n{shoppers} logged-in shoppers x {len(PAGES)} pages x {rounds} rounds")
+    make_catalog(categories=10, products=2000)
+    clients = make_shoppers(shoppers)
+    # Warm the card and count caches so both runs measure steady state
+    run_load("warm-up", clients, 1)
+
+    with mock.patch('store.views.get_cart_count', legacy_cart_count), \
+            mock.patch('store.page_cache.get_cart_count', legacy_cart_count), \
+            mock.patch('store.conditional.get_cart_count', legacy_cart_count):
+        run_load("before: cart lookup per page", clients, rounds)
+    run_load("after: cached badge count", clients, rounds)
+
+
+if __name__ == "__main__":
+    shoppers = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print("CART BADGE LOAD TEST")
+    print("=" * 50)
+    with scratch_database():
+        run(shoppers, rounds)
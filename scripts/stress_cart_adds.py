@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+from unittest import mock
+
+from bench_utils import make_catalog, scratch_database
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+
+from store.models import Cart, CartItem, Product
+
+SIZES = ['S', 'M']
+
+
+def legacy_add_item(cart, product, quantity=1, size=''):
+    """add_to_cart as it used to be: read the line, then write the new quantity from Python"""
+    with transaction.atomic():
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart, product=product, size=size, defaults={'quantity': quantity}
+        )
+        if not created:
+            cart_item.cart = cart
+            cart_item.quantity += quantity
+            cart_item.save()
+    return cart_item
+
+
+def fire(user, products, adds, results, barrier):
+    client = Client()
+    client.force_login(user)
+    ok = failed = 0
+    barrier.wait()
+    for i in range(adds):
+        product = products[i % len(products)]
+        response = client.post('/add-to-cart/', {'product_id': product.pk, 'quantity': 1,
+                                                 'size': SIZES[i % len(SIZES)]})
+        if response.json().get('success'):
+            ok += 1
+        else:
+            failed += 1
+    results.append((ok, failed))
+    connection.close()
+
+
+def run_round(label, user, products, threads, adds):
+    CartItem.objects.filter(cart__user=user).delete()
+    Cart.objects.filter(user=user).update(item_count=0, subtotal=0)
+    results = []
+    barrier = threading.Barrier(threads)
+    workers = [threading.Thread(target=fire, args=(user, products, adds, results, barrier)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    cart = Cart.objects.get(user=user)
+    stored = sum(CartItem.objects.filter(cart=cart).values_list('quantity', flat=True))
+    print(f"  {label:<30} {ok + failed:5d} adds in {elapsed:6.2f}s ({(ok + failed) / elapsed:7.1f}/s)"
+          f"  {failed:4d} failed  {threads * adds - stored:4d} lost  cart count {cart.item_count}")
+    return threads * adds, ok, stored, cart
+
+
+def run(threads, adds):
+    print(f"\n{threads} threads x {adds} adds at one cart, {len(SIZES)} sizes x 3 products")
+    make_catalog(categories=2, products=20)
+    user = User.objects.create_user('stress', password='x')
+    Cart.objects.create(user=user)
+    products = list(Product.objects.filter(available=True)[:3])
+    # add_to_cart refuses units beyond stock; this test is about lost updates, not stock limits
+    Product.objects.filter(pk__in=[product.pk for product in products]).update(stock_quantity=threads * adds)
+
+    with mock.patch('store.views.add_item', legacy_add_item):
+        run_round("before: get_or_create + save", user, products, threads, adds)
+    expected, ok, stored, cart = run_round("after: atomic upsert", user, products, threads, adds)
+
+    assert ok == expected, f"{expected - ok} adds failed"
+    assert stored == expected, f"lines hold {stored}, expected {expected}"
+    assert cart.item_count == expected, f"cart count {cart.item_count}, expected {expected}"
+    assert Cart.refresh_totals() == 0, "stored cart totals drifted from the lines"
+    for product in products:
+        for size in SIZES:
+            line = CartItem.objects.get(cart=cart, product=product, size=size)
+            share = sum(1 for i in range(adds) if products[i % len(products)] == product and SIZES[i % len(SIZES)] == size)
+            assert line.quantity == share * threads, (product.pk, size, line.quantity)
+    print("  every add was applied exactly once")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    adds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print("CONCURRENT CART ADD STRESS TEST")
+    print("=" * 50)
+    with scratch_database(on_disk=True):
+        run(threads, adds)
@@ -1,9 +1,12 @@
 from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Wishlist, WishlistItem
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Category, Product, Cart, CartItem, Wishlist, WishlistItem, Order, OrderItem, DailySales
+from . import order_export, sales
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'product_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
     list_per_page = 20
@@ -61,3 +64,83 @@ class WishlistAdmin(admin.ModelAdmin):
     
     def item_count(self, obj):
         return obj.items.count()
+
+class OrderItemInline(admin.TabularInline):
+    # Lines are a snapshot of the order as placed
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    fields = readonly_fields = ['product', 'size', 'quantity', 'price', 'total']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+def _export_response(queryset, export_format):
+    # Streamed in keyset chunks, so exporting every order does not load them all
+    rows = order_export.order_rows(queryset)
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(order_export.render_lines(rows, export_format),
+                                     content_type=content_type + '; charset=utf-8')
+    filename = 'orders-%s.%s' % (timezone.now().strftime('%Y%m%d-%H%M%S'), export_format)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'full_name', 'city', 'item_count', 'total_price', 'status', 'created_at']
+    list_filter = ['status', 'payment_method', 'created_at']
+    search_fields = ['=id', 'user__username', 'full_name', 'phone', 'postal_code']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    readonly_fields = ['item_count', 'first_product_name']
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+    inlines = [OrderItemInline]
+    actions = ['export_csv', 'export_ndjson']
+
+    def has_export_permission(self, request):
+        return request.user.has_perm('store.export_order')
+
+    @admin.action(description="Export selected orders with their lines as CSV", permissions=['export'])
+    def export_csv(self, request, queryset):
+        return _export_response(queryset, 'csv')
+
+    @admin.action(description="Export selected orders with their lines as NDJSON", permissions=['export'])
+    def export_ndjson(self, request, queryset):
+        return _export_response(queryset, 'ndjson')
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'product', 'size', 'quantity', 'price', 'total']
+    search_fields = ['=order__id', 'product__name']
+    list_select_related = ['order', 'product']
+    raw_id_fields = ['order', 'product']
+    list_per_page = 50
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Sales dashboard; reads the rollups kept by store.sales, never the orders"""
+    change_list_template = 'admin/store/dailysales/change_list.html'
+    list_display = ['day', 'orders', 'units', 'revenue']
+    date_hierarchy = 'day'
+    ordering = ['-day']
+    list_per_page = 31
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            response.context_data['sales'] = sales.report(changelist.queryset)
+        return response
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import signals
+        from . import shared_cache  # noqa: F401 - registers its deploy check
+        post_migrate.connect(signals.create_search_index, sender=self)
@@ -0,0 +1,109 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip siblings are still written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico')
+
+# Hashed filenames never change content, so browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+UNHASHED_CACHE_CONTROL = 'public, max-age=300'
+
+# Content-Encoding, file suffix; in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _write_if_smaller(path, original_size, data):
+    if len(data) < original_size:
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+
+def compress_file(path):
+    """Write .gz (and .br when brotli is installed) siblings next to a collected file"""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    _write_if_smaller(path + '.gz', len(data), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_if_smaller(path + '.br', len(data), brotli.compress(data, quality=11))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Content-hashed static files with pre-compressed siblings.
+
+    collectstatic writes style.<hash>.css plus style.<hash>.css.gz/.br and a
+    manifest that {% static %} resolves through, so requests never pay for
+    compression and the hashed URLs can be cached as immutable.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        collected = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                collected.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(collected):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(name))
+
+
+@lru_cache(maxsize=1)
+def _hashed_names():
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        key, _, value = params.strip().partition('=')
+        if key.strip() == 'q':
+            try:
+                if float(value) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve_static(request, path):
+    """Serve a collected file from STATIC_ROOT, preferring a pre-compressed sibling"""
+    if not settings.STATIC_ROOT:
+        raise Http404
+    name = posixpath.normpath(path).lstrip('/')
+    full_path = safe_join(settings.STATIC_ROOT, name)
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    accepted = _accepted_encodings(request)
+    served_path, content_encoding = full_path, None
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + suffix):
+            served_path, content_encoding = full_path + suffix, coding
+            break
+
+    response = FileResponse(open(served_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    del response['Content-Disposition']
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    response['Vary'] = 'Accept-Encoding'
+    if name in _hashed_names():
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = UNHASHED_CACHE_CONTROL
+    return response
@@ -0,0 +1,95 @@
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import page_cache
+from .images import VARIANTS, image_sources
+
+CARD_TEMPLATE = 'store/_product_card.html'
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Unsplash photo ids for the seeded catalogue, used when a product has no uploaded image
+STOCK_PHOTOS = {
+    'classic-business-suit': 'photo-1507003211169-0a1dd7228f2d',
+    'casual-cotton-polo': 'photo-1521572163474-6864f9cf17ab',
+    'denim-jacket': 'photo-1551698618-1dfe5d97d256',
+    'oxford-dress-shirt': 'photo-1602810318383-e386cc2a3ccf',
+    'casual-chinos': 'photo-1473966968600-fa801b869a1a',
+    'elegant-evening-dress': 'photo-1595777457583-95e059d581b8',
+    'casual-summer-blouse': 'photo-1594633312681-425c7b97ccd1',
+    'professional-blazer': 'photo-1573496359142-b8d87734a5a2',
+    'midi-wrap-dress': 'photo-1515372039744-b8f02a3ae446',
+    'silk-scarf-blouse': 'photo-1677478863154-55ecce8c7536',
+    'designer-leather-handbag': 'photo-1553062407-98eeb64c6a62',
+    'classic-wristwatch': 'photo-1524592094714-0f0654e20314',
+    'silk-scarf-collection': 'photo-1601924994987-69e26d50dc26',
+    'leather-belt': 'photo-1553062407-98eeb64c6a62',
+    'pearl-necklace': 'photo-1515562141207-7a88fb7ce338',
+    'premium-leather-boots': 'photo-1549298916-b41d501d3772',
+    'athletic-running-shoes': 'photo-1542291026-7eec264c27ff',
+    'elegant-high-heels': 'photo-1543163521-1bf539c55dd2',
+    'casual-sneakers': 'photo-1560769629-975ec94e6a86',
+    'oxford-dress-shoes': 'photo-1449824913935-59a10b8d2000',
+    'limited-edition-sneakers': 'photo-1551107696-a4b0c5a0d9a2',
+    'designer-crossbody-bag': 'photo-1548036328-c9fa89d128fa',
+    'sustainable-cotton-tshirt': 'photo-1521572163474-6864f9cf17ab',
+    'trendy-sunglasses': 'photo-1572635196237-14b3f281503f',
+    'modern-minimalist-watch': 'photo-1523275335684-37898b6baf30',
+}
+DEFAULT_PHOTO = 'photo-1441986300917-64674bd600d8'
+
+
+def stock_image_url(product, width, height):
+    photo = STOCK_PHOTOS.get(product.slug, DEFAULT_PHOTO)
+    return f"https://images.unsplash.com/{photo}?w={width}&h={height}&fit=crop&q=80"
+
+
+def product_image(product, variant='card'):
+    """src/srcset for a product image: pipeline derivatives, the upload, or the stock photo"""
+    sources = image_sources(product, variant)
+    if sources:
+        return sources
+    width, height = VARIANTS[variant]
+    return {
+        'src': stock_image_url(product, width, height),
+        'srcset': '%s %dw, %s %dw' % (
+            stock_image_url(product, width, height), width,
+            stock_image_url(product, width * 2, height * 2), width * 2,
+        ),
+        'width': width,
+        'height': height,
+    }
+
+
+def _card_key(product, catalog_version):
+    # updated_at moves on every save; the catalog version covers category renames
+    return 'product-card:%s:%s:%d:%s' % (
+        product.pk, product.updated_at.timestamp(), product.is_new_arrival, catalog_version,
+    )
+
+
+def render_product_cards(products):
+    """Return the card HTML for each product, rendering only the cards not cached yet"""
+    products = list(products)
+    if not products:
+        return []
+    catalog_version = page_cache.tag_version('site')
+    keys = [_card_key(product, catalog_version) for product in products]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    template = None
+    for key, product in zip(keys, products):
+        if key in cached:
+            continue
+        template = template or get_template(CARD_TEMPLATE)
+        missing[key] = template.render({
+            'product': product,
+            'image': product_image(product, 'card'),
+            'sizes': product.get_sizes_list(),
+            'is_new': product.is_new_arrival,
+        })
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+    return [mark_safe(cached[key]) for key in keys]
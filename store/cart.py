@@ -0,0 +1,265 @@
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import guest_cart, shared_cache
+from .locking import write_transaction
+from .models import Cart, CartItem, Product
+
+# Capped by shared_cache when the cache is local to each process
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def _owner_key(user_id=None, session_key=None):
+    if user_id:
+        return 'cart-count:user:%s' % user_id
+    if session_key:
+        return 'cart-count:session:%s' % session_key
+    return None
+
+
+def _request_key(request):
+    if hasattr(request, 'user') and request.user.is_authenticated:
+        return _owner_key(user_id=request.user.pk)
+    return _owner_key(session_key=request.session.session_key)
+
+
+def get_cart_count(request):
+    """Number of items in the current user's or session's cart, without creating one.
+
+    Served from the cache, keyed by the cart's owner so every device of a
+    logged-in user sees the same badge; the cart tables are only read on a
+    miss. Cart mutations refresh the entry through remember_cart_count().
+    """
+    if not request.user.is_authenticated and guest_cart.enabled():
+        return guest_cart.load(request).item_count
+    key = _request_key(request)
+    if key is None:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        if request.user.is_authenticated:
+            carts = Cart.objects.filter(user=request.user)
+        else:
+            carts = Cart.objects.filter(session_key=request.session.session_key)
+        count = carts.values_list('item_count', flat=True).first() or 0
+        cache.set(key, count, shared_cache.timeout(CART_COUNT_TIMEOUT))
+    return count
+
+
+def remember_cart_count(cart):
+    """Store a cart's current item_count as its owner's badge count"""
+    key = _owner_key(cart.user_id, cart.session_key)
+    if key:
+        cache.set(key, cart.item_count, shared_cache.timeout(CART_COUNT_TIMEOUT))
+
+
+def forget_cart_count(user_id=None, session_key=None):
+    """Drop a cached badge count so the next page reads it from the cart"""
+    key = _owner_key(user_id, session_key)
+    if key:
+        cache.delete(key)
+
+
+def _increment_line_sql():
+    """Insert a cart line or add to the existing one in a single statement.
+
+    The increment happens inside the database, so concurrent adds of the
+    same product and size can neither lose an update nor collide on the
+    unique constraint.
+    """
+    table = CartItem._meta.db_table
+    return f"""
+        INSERT INTO {table} (cart_id, product_id, size, quantity, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (cart_id, product_id, size) DO UPDATE SET quantity = {table}.quantity + excluded.quantity
+        RETURNING id, quantity
+    """
+
+
+def add_item(cart, product, quantity=1, size=''):
+    """Add quantity of a product in a size to the cart and return the line.
+
+    The line and the cart totals move in one transaction using database-side
+    increments; the cart instance is refreshed with the new totals.
+    """
+    if getattr(cart, 'is_guest', False):
+        cart, lines = apply_operations(cart, [{'op': 'add', 'product_id': product.pk, 'quantity': quantity, 'size': size}])
+        return next(line for line in lines if line.product_id == product.pk and line.size == size[:10])
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(_increment_line_sql(), [cart.pk, product.pk, size, quantity, created_at])
+            item_id, line_quantity = cursor.fetchone()
+        carts = Cart.objects.filter(pk=cart.pk)
+        carts.update(
+            item_count=F('item_count') + quantity,
+            subtotal=F('subtotal') + quantity * product.price,
+            updated_at=timezone.now(),
+        )
+        cart.item_count, cart.subtotal = carts.values_list('item_count', 'subtotal').get()
+    remember_cart_count(cart)
+    return CartItem(pk=item_id, cart=cart, product=product, size=size, quantity=line_quantity)
+
+
+MAX_OPERATIONS = 100
+
+_totals_suspended = ContextVar('cart_totals_suspended', default=False)
+
+
+class CartOperationError(ValueError):
+    """A batch operation that cannot be applied; the whole batch is rolled back"""
+
+    def __init__(self, index, message):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+
+
+def totals_suspended():
+    """True while a batch writes the cart totals itself, so per-line handlers stand down"""
+    return _totals_suspended.get()
+
+
+@contextmanager
+def suspend_line_totals():
+    """Silence the per-line totals handlers for writes whose caller settles the totals itself"""
+    token = _totals_suspended.set(True)
+    try:
+        yield
+    finally:
+        _totals_suspended.reset(token)
+
+
+def _integer(index, value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CartOperationError(index, f"{name} must be an integer")
+
+
+def _quantity(index, value, minimum):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise CartOperationError(index, "quantity must be a whole number")
+    if quantity < minimum:
+        raise CartOperationError(index, f"quantity must be at least {minimum}")
+    return quantity
+
+
+def _replay(operations, existing):
+    """Replay operations in order against a cart's lines in memory.
+
+    `existing` maps item id to CartItem. Returns the resulting lines keyed by
+    (product id, size); lines that must be inserted have no pk.
+    """
+    lines = {(item.product_id, item.size): item for item in existing.values()}
+    by_id = dict(existing)
+
+    product_ids = {
+        index: _integer(index, op.get('product_id'), 'product_id')
+        for index, op in enumerate(operations) if isinstance(op, dict) and op.get('op') == 'add'
+    }
+    products = Product.objects.filter(available=True).select_related('category').in_bulk(set(product_ids.values()))
+
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            raise CartOperationError(index, "expected an object")
+        kind = op.get('op')
+        if kind == 'add':
+            product = products.get(product_ids[index])
+            if product is None:
+                raise CartOperationError(index, "product not found")
+            size = str(op.get('size', ''))[:10]
+            quantity = _quantity(index, op.get('quantity', 1), 1)
+            line = lines.get((product.pk, size))
+            if line is None:
+                line = CartItem(product=product, size=size, quantity=0)
+                lines[(product.pk, size)] = line
+            line.quantity += quantity
+            continue
+
+        line = by_id.get(_integer(index, op.get('item_id'), 'item_id'))
+        if line is None or lines.get((line.product_id, line.size)) is not line:
+            raise CartOperationError(index, "item not found in cart")
+        if kind == 'remove' or (kind == 'set' and _quantity(index, op.get('quantity'), 0) == 0):
+            del lines[(line.product_id, line.size)]
+        elif kind == 'set':
+            line.quantity = _quantity(index, op.get('quantity'), 1)
+        elif kind == 'size':
+            size = str(op.get('size', ''))[:10]
+            if size == line.size:
+                continue
+            del lines[(line.product_id, line.size)]
+            target = lines.get((line.product_id, size))
+            if target is not None:
+                target.quantity += line.quantity
+                by_id[line.pk] = target
+            else:
+                # Re-inserted under the new size so no update can trip the unique constraint
+                moved = CartItem(product=line.product, size=size, quantity=line.quantity)
+                lines[(line.product_id, size)] = moved
+                by_id[line.pk] = moved
+        else:
+            raise CartOperationError(index, "op must be one of add, set, remove, size")
+    return lines
+
+
+def apply_operations(cart, operations):
+    """Apply a list of add / set / remove / size operations to a cart in one transaction.
+
+    Operations are replayed in order against the cart's lines in memory, then
+    written with one delete, one bulk update and one bulk insert, and the
+    cart totals are written once; the query count does not grow with the
+    batch. Guest carts are rewritten in their own storage instead. Returns
+    the cart and its lines after the batch.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise CartOperationError(0, "expected a non-empty list of operations")
+    if len(operations) > MAX_OPERATIONS:
+        raise CartOperationError(MAX_OPERATIONS, f"at most {MAX_OPERATIONS} operations per batch")
+
+    if getattr(cart, 'is_guest', False):
+        # Replayed on copies so a rejected batch leaves the loaded lines untouched
+        lines = _replay(operations, {line.pk: copy.copy(line) for line in cart.lines})
+        if len(lines) > guest_cart.MAX_LINES:
+            raise CartOperationError(len(operations) - 1, f"a guest cart holds at most {guest_cart.MAX_LINES} lines")
+        cart.store(sorted(lines.values(), key=lambda line: (line.pk is None, line.pk or 0)))
+        return cart, cart.lines
+
+    with write_transaction():
+        # Serialises batches and single-line changes on the same cart
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        existing = {item.pk: item for item in CartItem.objects.filter(cart=cart).select_related('product')}
+        lines = _replay(operations, existing)
+
+        kept = {line.pk for line in lines.values() if line.pk is not None}
+        deleted = [pk for pk in existing if pk not in kept]
+        changed = [existing[pk] for pk in kept if existing[pk].quantity != existing[pk]._loaded_values['quantity']]
+        created = [line for line in lines.values() if line.pk is None]
+        for line in created:
+            line.cart = cart
+
+        with suspend_line_totals():
+            if deleted:
+                CartItem.objects.filter(pk__in=deleted).delete()
+            if changed:
+                CartItem.objects.bulk_update(changed, ['quantity'])
+            if created:
+                CartItem.objects.bulk_create(created)
+
+        final = sorted(lines.values(), key=lambda line: (line.pk is None, line.pk or 0))
+        cart.item_count = sum(line.quantity for line in final)
+        cart.subtotal = sum((line.quantity * line.product.price for line in final), Decimal('0'))
+        Cart.objects.filter(pk=cart.pk).update(
+            item_count=cart.item_count, subtotal=cart.subtotal, updated_at=timezone.now(),
+        )
+    remember_cart_count(cart)
+    return cart, final
+
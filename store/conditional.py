@@ -0,0 +1,116 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import guest_cart
+from .cart import get_cart_count
+from .models import Category, Product
+
+
+def _catalog_state(request):
+    """Latest change and a fingerprint for the data every catalog page renders.
+
+    Two indexed aggregates: MAX(updated_at) over products and a summary of
+    the categories (names, navigation, stored counts). Memoised per request
+    because both the ETag and Last-Modified callbacks need it.
+    """
+    if not hasattr(request, '_catalog_state'):
+        latest_product = Product.objects.aggregate(latest=Max('updated_at'))['latest']
+        categories = Category.objects.aggregate(
+            latest=Max('updated_at'), count=Count('id'), products=Sum('product_count'),
+        )
+        changes = [stamp for stamp in (latest_product, categories['latest']) if stamp]
+        request._catalog_state = (
+            max(changes) if changes else None,
+            '%s|%s|%s|%s' % (latest_product, categories['latest'], categories['count'], categories['products']),
+        )
+    return request._catalog_state
+
+
+def _viewer_state(request):
+    """The parts of a page that differ per visitor: login, cart badge and CSRF token"""
+    user_id = request.user.pk if request.user.is_authenticated else ''
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return '%s|%s|%s' % (user_id, get_cart_count(request), csrf_cookie)
+
+
+def _is_shared_page(request):
+    # Without a login, session or guest cart the page carries no per-visitor
+    # state besides the CSRF cookie, so Last-Modified alone is a safe validator
+    return (not request.user.is_authenticated and not request.session.session_key
+            and guest_cart.COOKIE_NAME not in request.COOKIES)
+
+
+def _has_pending_messages(request):
+    return len(messages.get_messages(request)) > 0
+
+
+def _etag(*parts):
+    # The date keeps day-based badges like "New" from being revalidated forever
+    raw = '|'.join(str(part) for part in parts + (timezone.localdate(),))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _product_state(request, slug):
+    if not hasattr(request, '_product_state'):
+        request._product_state = Product.objects.filter(slug=slug, available=True).values_list(
+            'pk', 'updated_at', 'recommendation__updated_at'
+        ).first()
+    return request._product_state
+
+
+def listing_etag(request, *args, **kwargs):
+    if _has_pending_messages(request):
+        return None
+    _latest, fingerprint = _catalog_state(request)
+    return _etag(request.get_full_path(), fingerprint, _viewer_state(request))
+
+
+def listing_last_modified(request, *args, **kwargs):
+    if _has_pending_messages(request) or not _is_shared_page(request):
+        return None
+    return _catalog_state(request)[0]
+
+
+def product_etag(request, slug, **kwargs):
+    product = _product_state(request, slug)
+    if product is None or _has_pending_messages(request):
+        return None
+    _latest, fingerprint = _catalog_state(request)
+    return _etag(request.get_full_path(), *product, fingerprint, _viewer_state(request))
+
+
+def product_last_modified(request, slug, **kwargs):
+    product = _product_state(request, slug)
+    if product is None or _has_pending_messages(request) or not _is_shared_page(request):
+        return None
+    latest, _fingerprint = _catalog_state(request)
+    return max(stamp for stamp in (product[1], product[2], latest) if stamp)
+
+
+def conditional_page(etag_func, last_modified_func):
+    """Answer revalidations with 304 before the view (or the page cache) runs.
+
+    Responses are marked no-cache so browsers and proxies always revalidate
+    instead of guessing a freshness lifetime from Last-Modified. Must be the
+    outermost decorator so a 304 skips every catalog query.
+    """
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                patch_cache_control(response, no_cache=True)
+                # The validators cover the login, cart and CSRF cookies
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
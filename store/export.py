@@ -0,0 +1,124 @@
+import csv
+import hmac
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Max, Q
+from django.urls import reverse
+
+from .facets import split_sizes
+from .models import Product
+
+FORMATS = ('ndjson', 'csv')
+
+COLUMNS = ['id', 'slug', 'name', 'category', 'category_slug', 'sizes', 'price',
+           'available', 'url', 'image', 'updated_at']
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def authorized(request):
+    """Staff, or a partner presenting one of CATALOG_EXPORT_TOKENS as a bearer token"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(
+        hmac.compare_digest(token.encode(), allowed.encode())
+        for allowed in getattr(settings, 'CATALOG_EXPORT_TOKENS', [])
+    )
+
+
+def export_window(since=None):
+    """Upper bound for an export so it is a consistent snapshot.
+
+    Rows updated after this moment are left for the next run, which should
+    pass the returned value as `since`.
+    """
+    queryset = Product.objects.all()
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    return queryset.aggregate(until=Max('updated_at'))['until']
+
+
+def _chunks(queryset, chunk_size):
+    """Lists of product value rows in (updated_at, id) order.
+
+    Each chunk is its own short keyset query, so no cursor, and with it no
+    SQLite read lock that would keep checkouts from committing, stays open
+    while a slow client downloads the export.
+    """
+    queryset = queryset.order_by('updated_at', 'id').values_list(
+        'id', 'slug', 'name', 'category__name', 'category__slug', 'sizes', 'price',
+        'available', 'image', 'updated_at',
+    )
+    position = None
+    while True:
+        page = queryset
+        if position is not None:
+            t, pk = position
+            page = page.filter(Q(updated_at__gte=t), Q(updated_at__gt=t) | Q(id__gt=pk))
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        position = rows[-1][-1], rows[-1][0]
+
+
+def export_rows(since=None, until=None, base_url=''):
+    """Yield one dict per product in updated_at order, reading in keyset chunks.
+
+    Unavailable products are included so incremental syncs can delist them.
+    """
+    queryset = Product.objects.all()
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lte=until)
+    # reverse() per row dominates the export time on large catalogs
+    url_pattern = base_url + reverse('store:product_detail', kwargs={'slug': 'slug-placeholder'})
+    rows = (row for chunk in _chunks(queryset, CHUNK_SIZE) for row in chunk)
+    for pk, slug, name, category, category_slug, sizes, price, available, image, updated_at in rows:
+        yield {
+            'id': pk,
+            'slug': slug,
+            'name': name,
+            'category': category,
+            'category_slug': category_slug,
+            'sizes': split_sizes(sizes),
+            'price': str(price),
+            'available': available,
+            'url': url_pattern.replace('slug-placeholder', slug),
+            'image': default_storage.url(image) if image else '',
+            'updated_at': updated_at.isoformat(),
+        }
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        row['sizes'] = ','.join(row['sizes'])
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def render_lines(rows, export_format):
+    if export_format == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
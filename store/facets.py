@@ -0,0 +1,175 @@
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Value, When
+
+from .models import FacetCount, Product, ProductSize
+
+# (slug, label, lower bound inclusive, upper bound exclusive) in ascending order
+PRICE_BANDS = [
+    ('under-5000', 'Under ₹5,000', None, 5000),
+    ('5000-10000', '₹5,000 – ₹10,000', 5000, 10000),
+    ('10000-20000', '₹10,000 – ₹20,000', 10000, 20000),
+    ('20000-50000', '₹20,000 – ₹50,000', 20000, 50000),
+    ('over-50000', '₹50,000 & above', 50000, None),
+]
+PRICE_BAND_SLUGS = {slug for slug, _label, _low, _high in PRICE_BANDS}
+
+SIZE_ORDER = [code for code, _label in Product.SIZES]
+
+
+def split_sizes(value):
+    """Parse the comma-separated Product.sizes string the same way get_sizes_list does"""
+    sizes = []
+    for size in (value or '').split(','):
+        size = size.strip()[:10]
+        if size and size not in sizes:
+            sizes.append(size)
+    return sizes
+
+
+def price_band_for(price):
+    """Slug of the PRICE_BANDS entry a price falls into"""
+    for slug, _label, _low, high in PRICE_BANDS:
+        if high is None or price < high:
+            return slug
+    return PRICE_BANDS[-1][0]
+
+
+def price_band_expression(field='price'):
+    """SQL CASE expression equivalent of price_band_for"""
+    whens = [
+        When(**{f'{field}__lt': high}, then=Value(slug))
+        for slug, _label, _low, high in PRICE_BANDS if high is not None
+    ]
+    return Case(*whens, default=Value(PRICE_BANDS[-1][0]), output_field=CharField())
+
+
+def filter_products(queryset, size='', price_band=''):
+    """Narrow a product queryset to the selected size and price band"""
+    if size:
+        queryset = queryset.filter(size_entries__size=size)
+    for slug, _label, low, high in PRICE_BANDS:
+        if slug == price_band:
+            if low is not None:
+                queryset = queryset.filter(price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(price__lt=high)
+    return queryset
+
+
+def product_cells(category_id, price, sizes, available):
+    """Facet cells a product contributes to, given its persisted field values"""
+    if not available or category_id is None or price is None:
+        return []
+    band = price_band_for(price)
+    return [(category_id, band, '')] + [(category_id, band, size) for size in split_sizes(sizes)]
+
+
+def _bump(cell, delta):
+    category_id, price_band, size = cell
+    cells = FacetCount.objects.filter(category_id=category_id, price_band=price_band, size=size)
+    if delta < 0:
+        cells.filter(count__gte=-delta).update(count=F('count') + delta)
+        return
+    if cells.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(category_id=category_id, price_band=price_band, size=size, count=delta)
+    except IntegrityError:
+        # Another writer created the cell first
+        cells.update(count=F('count') + delta)
+
+
+def apply_cell_changes(old_cells, new_cells):
+    """Move a product's contribution from its old cells to its new ones"""
+    delta = Counter(new_cells)
+    delta.subtract(Counter(old_cells))
+    for cell, change in delta.items():
+        if change:
+            _bump(cell, change)
+
+
+def sync_product_sizes(product, old_sizes=None):
+    """Rewrite the ProductSize rows for a product when its sizes string changed"""
+    sizes = split_sizes(product.sizes)
+    if old_sizes is not None and split_sizes(old_sizes) == sizes:
+        return
+    ProductSize.objects.filter(product=product).delete()
+    ProductSize.objects.bulk_create([ProductSize(product=product, size=size) for size in sizes])
+
+
+def rebuild(batch_size=5000):
+    """Regenerate ProductSize rows and every facet count from the product table"""
+    with transaction.atomic():
+        ProductSize.objects.all().delete()
+        batch = []
+        for pk, sizes in Product.objects.order_by().values_list('pk', 'sizes').iterator(chunk_size=batch_size):
+            batch.extend(ProductSize(product_id=pk, size=size) for size in split_sizes(sizes))
+            if len(batch) >= batch_size:
+                ProductSize.objects.bulk_create(batch)
+                batch = []
+        ProductSize.objects.bulk_create(batch)
+
+        FacetCount.objects.all().delete()
+        product_rows = (
+            Product.objects.filter(available=True)
+            .annotate(band=price_band_expression())
+            .values('category_id', 'band')
+            .annotate(n=Count('pk'))
+            .order_by()
+            .values_list('category_id', 'band', 'n')
+        )
+        size_rows = (
+            ProductSize.objects.filter(product__available=True)
+            .annotate(band=price_band_expression('product__price'))
+            .values('product__category_id', 'band', 'size')
+            .annotate(n=Count('pk'))
+            .order_by()
+            .values_list('product__category_id', 'band', 'size', 'n')
+        )
+        rows = [FacetCount(category_id=c, price_band=b, size='', count=n) for c, b, n in product_rows]
+        rows += [FacetCount(category_id=c, price_band=b, size=s, count=n) for c, b, s, n in size_rows]
+        FacetCount.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def _size_sort_key(size):
+    if size in SIZE_ORDER:
+        return (0, SIZE_ORDER.index(size), size)
+    return (1, 0, size)
+
+
+class FacetCounts:
+    """All non-empty facet cells, loaded with one indexed query and summed in Python"""
+
+    def __init__(self):
+        self.cells = list(
+            FacetCount.objects.filter(count__gt=0).values_list('category_id', 'price_band', 'size', 'count')
+        )
+
+    def _totals(self, key, category_id=None, price_band='', size=''):
+        totals = defaultdict(int)
+        for cell_category, cell_band, cell_size, count in self.cells:
+            if category_id is not None and cell_category != category_id:
+                continue
+            if price_band and cell_band != price_band:
+                continue
+            if key == 'size':
+                if cell_size:
+                    totals[cell_size] += count
+            elif cell_size == size:
+                totals[cell_category if key == 'category' else cell_band] += count
+        return totals
+
+    def sizes(self, category_id=None, price_band=''):
+        totals = self._totals('size', category_id, price_band)
+        return [(size, totals[size]) for size in sorted(totals, key=_size_sort_key)]
+
+    def price_bands(self, category_id=None, size=''):
+        totals = self._totals('band', category_id, size=size)
+        return [(slug, label, totals[slug]) for slug, label, _low, _high in PRICE_BANDS if totals[slug]]
+
+    def categories(self, price_band='', size=''):
+        return self._totals('category', price_band=price_band, size=size)
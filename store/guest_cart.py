@@ -0,0 +1,159 @@
+"""Carts for anonymous visitors kept in the cache or a signed cookie.
+
+With GUEST_CART_ENGINE set to 'cache' or 'cookie', guests never get a
+session or a Cart row just for browsing, and changing a quantity writes no
+database rows. The cart is only written to Cart/CartItem when the visitor
+logs in (see session_merge.merge_guest_cart), which checkout requires. The
+default 'db' keeps guest carts as Cart rows keyed by session.
+"""
+import json
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from .models import CartItem, Product
+
+ENGINES = ('db', 'cache', 'cookie')
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'store.guest_cart'
+TIMEOUT = 60 * 60 * 24 * 30
+
+# A signed cookie must stay under the browsers' 4KB limit
+MAX_LINES = 50
+
+
+def engine():
+    return getattr(settings, 'GUEST_CART_ENGINE', 'db')
+
+
+def enabled():
+    return engine() in ('cache', 'cookie')
+
+
+def _cache_key(token):
+    return 'guest-cart:%s' % token
+
+
+class GuestCartItems:
+    """Stands in for the cart.items related manager in templates"""
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    def all(self):
+        return self.cart.lines
+
+    def count(self):
+        return len(self.cart.lines)
+
+
+class GuestCart:
+    """A cart that lives outside the database but reads like a Cart instance.
+
+    Lines are unsaved CartItem objects whose ids are local to this cart.
+    """
+    is_guest = True
+    pk = None
+    user = None
+    user_id = None
+    session_key = None
+
+    def __init__(self, token=None, data=None):
+        data = data or {}
+        self.token = token
+        self.next_id = data.get('n', 1)
+        # [item id, product id, size, quantity] per line
+        self.rows = [tuple(row) for row in data.get('l', [])]
+        self.dirty = False
+
+    @property
+    def items(self):
+        return GuestCartItems(self)
+
+    @cached_property
+    def lines(self):
+        products = Product.objects.filter(pk__in={row[1] for row in self.rows}).select_related('category').in_bulk()
+        return [
+            CartItem(id=item_id, product=products[product_id], size=size, quantity=quantity)
+            for item_id, product_id, size, quantity in self.rows if product_id in products
+        ]
+
+    @property
+    def item_count(self):
+        return sum(row[3] for row in self.rows)
+
+    @property
+    def subtotal(self):
+        return sum((line.get_total_price() for line in self.lines), Decimal('0'))
+
+    total_items = item_count
+    total_price = subtotal
+
+    def store(self, lines):
+        """Replace the cart's lines, numbering the ones that have no id yet"""
+        for line in lines:
+            if line.pk is None:
+                line.pk = self.next_id
+                self.next_id += 1
+        self.rows = [(line.pk, line.product_id, line.size, line.quantity) for line in lines]
+        self.__dict__['lines'] = list(lines)
+        self.dirty = True
+        if engine() == 'cache':
+            if not self.rows:
+                if self.token is not None:
+                    cache.delete(_cache_key(self.token))
+                return
+            if self.token is None:
+                self.token = secrets.token_urlsafe(16)
+            cache.set(_cache_key(self.token), self.data(), TIMEOUT)
+
+    def clear(self):
+        self.store([])
+
+    def data(self):
+        return {'n': self.next_id, 'l': self.rows}
+
+
+def load(request):
+    """The guest cart for this request, read once from its cookie or the cache"""
+    cart = getattr(request, '_guest_cart', None)
+    if cart is None:
+        value = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=TIMEOUT)
+        data = None
+        if value and engine() == 'cookie':
+            try:
+                data = json.loads(value)
+            except ValueError:
+                data = None
+        elif value:
+            data = cache.get(_cache_key(value))
+        cart = GuestCart(token=value if engine() == 'cache' else None, data=data)
+        request._guest_cart = cart
+    return cart
+
+
+class GuestCartMiddleware:
+    """Write a changed guest cart back to its cookie once the view has run"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_guest_cart', None)
+        if cart is None or not cart.dirty:
+            return response
+        if not cart.rows:
+            # Emptied, e.g. merged into the account at login
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+            return response
+        value = json.dumps(cart.data(), separators=(',', ':')) if engine() == 'cookie' else cart.token
+        response.set_signed_cookie(
+            COOKIE_NAME, value, salt=COOKIE_SALT, max_age=TIMEOUT,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+        )
+        return response
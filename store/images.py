@@ -0,0 +1,208 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height); ordered smallest first so they double as srcset candidates
+VARIANTS = {
+    'card': (400, 500),
+    'detail': (600, 700),
+    'zoom': (1200, 1400),
+}
+
+# Pillow format, file extension, save options
+FORMATS = [
+    ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+]
+
+DERIVATIVE_DIR = 'products/derived'
+
+_executor = None
+
+
+def _source_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def render_derivatives(data):
+    """Resize and recompress one source image into every variant and format.
+
+    Pure function of the image bytes so it can run in worker processes.
+    Returns {variant: {'width', 'height', ext: storage name}} with each
+    filename derived from the hash of the encoded bytes.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'L'):
+            source = source.convert('RGBA')
+            background = Image.new('RGB', source.size, (255, 255, 255))
+            background.paste(source, mask=source.getchannel('A'))
+            source = background
+        elif source.mode == 'L':
+            source = source.convert('RGB')
+
+        derivatives = {}
+        for variant, size in VARIANTS.items():
+            image = ImageOps.fit(source, size, Image.Resampling.LANCZOS)
+            entry = {'width': size[0], 'height': size[1]}
+            for pil_format, ext, options in FORMATS:
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, **options)
+                encoded = buffer.getvalue()
+                digest = hashlib.sha256(encoded).hexdigest()[:16]
+                name = f"{DERIVATIVE_DIR}/{variant}-{digest}.{ext}"
+                if not default_storage.exists(name):
+                    default_storage.save(name, ContentFile(encoded))
+                entry[ext] = name
+            derivatives[variant] = entry
+        return derivatives
+
+
+def _derivatives_for(image_name, current, force=False):
+    with default_storage.open(image_name, 'rb') as fh:
+        data = fh.read()
+    source = _source_hash(data)
+    if not force and current.get('source') == source:
+        return None
+    derivatives = render_derivatives(data)
+    derivatives['source'] = source
+    return derivatives
+
+
+def _store_derivatives(product_id, image_name, derivatives):
+    """Save the derivative map without going through Product.save()"""
+    from . import page_cache
+    from .models import Product
+
+    updated = Product.objects.filter(pk=product_id, image=image_name).update(
+        image_derivatives=derivatives,
+        # Moves the product card cache key on to the new image
+        updated_at=timezone.now(),
+    )
+    if updated:
+        slug = Product.objects.filter(pk=product_id).values_list('slug', flat=True).first()
+        page_cache.invalidate('product:%s' % slug, 'listings', 'home')
+
+
+def generate_for_product(product_id, force=False):
+    """Build and record the derivatives for one product's current image"""
+    from .models import Product
+
+    product = Product.objects.filter(pk=product_id).only('image', 'image_derivatives').first()
+    if product is None or not product.image:
+        return False
+    derivatives = _derivatives_for(product.image.name, product.image_derivatives or {}, force)
+    if derivatives is None:
+        return False
+    _store_derivatives(product_id, product.image.name, derivatives)
+    return True
+
+
+def _run_in_background(product_id):
+    try:
+        generate_for_product(product_id)
+    except Exception:
+        logger.exception("Image derivative generation failed for product %s", product_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(product_id):
+    """Queue derivative generation once the current transaction commits"""
+    if not getattr(settings, 'IMAGE_PIPELINE_ASYNC', True):
+        transaction.on_commit(lambda: generate_for_product(product_id))
+        return
+
+    def submit():
+        global _executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+                thread_name_prefix='image-pipeline',
+            )
+        _executor.submit(_run_in_background, product_id)
+
+    transaction.on_commit(submit)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _process_worker(product_id, image_name, current, force):
+    # Workers only touch storage; all database writes happen in the parent
+    return product_id, image_name, _derivatives_for(image_name, current, force)
+
+
+def regenerate_all(workers=None, force=False, progress=None):
+    """Regenerate derivatives for every product image using one process per core"""
+    from .models import Product
+
+    workers = workers or os.cpu_count() or 1
+    products = Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk').values_list(
+        'pk', 'image', 'image_derivatives'
+    )
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+
+    def collect(future):
+        try:
+            product_id, image_name, derivatives = future.result()
+        except Exception:
+            logger.exception("Image derivative generation failed")
+            counts['failed'] += 1
+            return
+        if derivatives is None:
+            counts['skipped'] += 1
+        else:
+            _store_derivatives(product_id, image_name, derivatives)
+            counts['done'] += 1
+        if progress:
+            progress(counts['done'], counts['skipped'], counts['failed'])
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Keep a bounded window of jobs in flight so memory stays flat on large catalogs
+        pending = set()
+        for pk, image, current in products.iterator(chunk_size=500):
+            pending.add(pool.submit(_process_worker, pk, image, current or {}, force))
+            if len(pending) >= workers * 4:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+        for future in as_completed(pending):
+            collect(future)
+    return counts['done'], counts['skipped'], counts['failed']
+
+
+def image_sources(product, variant='card'):
+    """src / srcset data for templates: derivatives when built, otherwise the plain image"""
+    derivatives = product.image_derivatives or {}
+    if product.image and derivatives.get(variant):
+        names = list(VARIANTS)
+        candidates = names[names.index(variant):]
+        return {
+            'src': default_storage.url(derivatives[variant]['jpg']),
+            'srcset': ', '.join(
+                f"{default_storage.url(derivatives[v]['jpg'])} {VARIANTS[v][0]}w" for v in candidates if v in derivatives
+            ),
+            'webp_srcset': ', '.join(
+                f"{default_storage.url(derivatives[v]['webp'])} {VARIANTS[v][0]}w" for v in candidates if v in derivatives
+            ),
+            'width': derivatives[variant]['width'],
+            'height': derivatives[variant]['height'],
+        }
+    if product.image:
+        return {'src': product.image.url}
+    return None
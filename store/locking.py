@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextmanager
+def write_transaction(using=DEFAULT_DB_ALIAS):
+    """atomic() for blocks that read rows and then write based on them.
+
+    SQLite ignores select_for_update(), and a default (deferred) transaction
+    that reads first fails with "database is locked" when it later tries to
+    write while another transaction holds the write lock. On SQLite the
+    outermost block therefore starts with BEGIN IMMEDIATE, taking the write
+    lock up front so concurrent writers queue behind each other. Other
+    transactions keep the default mode, so plain reads are not serialised.
+    Nested inside an open transaction it is an ordinary savepoint.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # Connecting resets transaction_mode from the settings, so connect first
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous
+            yield
+    finally:
+        connection.transaction_mode = previous
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = "Update product co-occurrence counts from orders and wishlists and refresh recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Recount from scratch instead of folding in rows added since the last run")
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K,
+                            help="Neighbours stored per product")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pairs, products = recommendations.build(full=options['full'], top_k=options['top_k'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {products} product(s) from {pairs} stored pair(s) in {elapsed:.1f}s"
+        ))
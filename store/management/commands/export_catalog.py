@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store import export
+
+
+class Command(BaseCommand):
+    help = "Write the catalog as NDJSON or CSV, optionally only products changed since a given time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--since', help="ISO 8601 datetime; only export products updated after it")
+        parser.add_argument('--output', help="File to write to (defaults to stdout)")
+        parser.add_argument('--base-url', default='', help="Prefix for product URLs, e.g. https://closetverse.example")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 datetime")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        until = export.export_window(since)
+        rows = export.export_rows(since, until, base_url=options['base_url'].rstrip('/'))
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        written = 0
+        try:
+            for line in export.render_lines(rows, options['format']):
+                output.write(line)
+                written += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['format'] == 'csv':
+            written -= 1
+        # stderr keeps stdout clean for piping the export itself
+        self.stderr.write(f"Exported {max(written, 0)} product(s)")
+        if until:
+            self.stderr.write(f"Next incremental run: --since {until.isoformat()}")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import images
+
+
+class Command(BaseCommand):
+    help = "Generate resized JPEG/WebP copies of every product image in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes (defaults to the number of CPU cores)")
+        parser.add_argument('--force', action='store_true',
+                            help="Rebuild even when the source image has not changed")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done, skipped, failed):
+            total = done + skipped + failed
+            if total % 100 == 0:
+                self.stdout.write(f"  {total} processed ({done} built, {skipped} unchanged, {failed} failed)")
+
+        done, skipped, failed = images.regenerate_all(
+            workers=options['workers'], force=options['force'], progress=progress
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {done}, skipped {skipped}, failed {failed} in {elapsed:.1f}s"
+        ))
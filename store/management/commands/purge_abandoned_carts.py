@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import purge
+
+
+class Command(BaseCommand):
+    help = ("Delete guest carts and wishlists whose session is gone or that sat idle too long; "
+            "run_tasks also runs this daily as the store.purge_abandoned_carts task")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ABANDONED_CART_DAYS', 30),
+                            help="Idle days after which a guest cart or wishlist is abandoned")
+        parser.add_argument('--chunk-size', type=int, default=purge.CHUNK_SIZE,
+                            help="Carts or wishlists deleted per transaction")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between chunks so other writers get the lock")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if options['dry_run']:
+            carts = purge.abandoned_carts(days).count()
+            wishlists = purge.abandoned_wishlists(days).count()
+            self.stdout.write(f"Would delete {carts} cart(s) and {wishlists} wishlist(s)")
+            return
+
+        started = time.perf_counter()
+        deleted = purge.purge_abandoned(days, chunk_size=options['chunk_size'], pause=options['pause'])
+        elapsed = time.perf_counter() - started
+        rows = sum(deleted.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted['carts']} cart(s) with {deleted['cart_items']} line(s) and "
+            f"{deleted['wishlists']} wishlist(s) with {deleted['wishlist_items']} item(s) "
+            f"in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
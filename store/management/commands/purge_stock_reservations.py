@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import stock
+
+
+class Command(BaseCommand):
+    help = "Delete expired stock holds; they already stopped counting against stock when they expired"
+
+    def handle(self, *args, **options):
+        deleted = stock.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired reservation(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+
+
+class Command(BaseCommand):
+    help = "Regenerate product size rows and the precomputed facet counts"
+
+    def handle(self, *args, **options):
+        cells = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {cells} facet cell(s)"))
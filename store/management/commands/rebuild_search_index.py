@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 product search index from scratch"
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Full-text search index requires the SQLite backend")
+        search.create_index()
+        indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} product(s)"))
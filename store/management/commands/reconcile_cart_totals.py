@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Check the stored item count and subtotal of every cart against its lines and fix drift"
+
+    def handle(self, *args, **options):
+        updated = Cart.refresh_totals()
+        if updated:
+            self.stdout.write(self.style.WARNING(f"Corrected {updated} cart total(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS("All cart totals match their items"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored available-product count of every category"
+
+    def handle(self, *args, **options):
+        updated = Category.refresh_product_counts()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {updated} category count(s)"))
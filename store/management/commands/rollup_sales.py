@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import sales
+
+
+class Command(BaseCommand):
+    help = "Fold new orders into the daily sales rollups, or rebuild them from every order with --rebuild"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Empty the rollups and recompute them from the whole order history")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Threads aggregating history chunks during --rebuild")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Orders per transaction, or order ids per chunk with --rebuild")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            folded = sales.rebuild(
+                workers=options['workers'],
+                chunk_size=options['chunk_size'] or sales.REBUILD_CHUNK_SIZE,
+            )
+        else:
+            folded = sales.roll_up(chunk_size=options['chunk_size'] or sales.CHUNK_SIZE)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {folded} order(s) into the sales rollups in {elapsed:.1f}s "
+            f"({folded / elapsed if elapsed else 0:.0f} orders/s)"
+        ))
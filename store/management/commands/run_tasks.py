@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued and recurring background tasks in a pool of worker threads or processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help="Worker threads (or processes with --processes)")
+        parser.add_argument('--processes', action='store_true',
+                            help="Run each worker in its own process, for CPU-bound tasks")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when no task is due instead of polling for more")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle worker waits before looking for tasks again")
+
+    def handle(self, *args, **options):
+        purged = tasks.purge_finished()
+        if purged:
+            self.stdout.write(f"Deleted {purged} finished task(s) older than {tasks.RETENTION_DAYS} days")
+        for task_row in tasks.schedule_periodic():
+            self.stdout.write(f"Scheduled recurring task {task_row.name}")
+        started = time.perf_counter()
+        try:
+            succeeded, failed = tasks.run_workers(
+                workers=options['workers'], processes=options['processes'],
+                once=options['once'], poll_interval=options['poll_interval'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+            return
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {succeeded + failed} task(s), {failed} failed, in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:58
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_product_counts(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    counts = Category.objects.annotate(
+        live_count=Count('products', filter=Q(products__available=True))
+    ).values_list('pk', 'live_count')
+    for pk, live_count in counts:
+        Category.objects.filter(pk=pk).update(product_count=live_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_order_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of available products (maintained automatically)'),
+        ),
+        migrations.RunPython(populate_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+# Copies of store.facets as of this migration, so later changes there cannot alter it
+PRICE_BAND_UPPER_BOUNDS = [
+    ('under-5000', 5000),
+    ('5000-10000', 10000),
+    ('10000-20000', 20000),
+    ('20000-50000', 50000),
+    ('over-50000', None),
+]
+
+
+def split_sizes(value):
+    sizes = []
+    for size in (value or '').split(','):
+        size = size.strip()[:10]
+        if size and size not in sizes:
+            sizes.append(size)
+    return sizes
+
+
+def price_band_for(price):
+    for slug, high in PRICE_BAND_UPPER_BOUNDS:
+        if high is None or price < high:
+            return slug
+    return PRICE_BAND_UPPER_BOUNDS[-1][0]
+
+
+def populate_facets(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSize = apps.get_model('store', 'ProductSize')
+    FacetCount = apps.get_model('store', 'FacetCount')
+    sizes_rows = []
+    cells = Counter()
+    for pk, category_id, price, sizes, available in Product.objects.values_list(
+        'pk', 'category_id', 'price', 'sizes', 'available'
+    ).iterator():
+        product_sizes = split_sizes(sizes)
+        sizes_rows.extend(ProductSize(product_id=pk, size=size) for size in product_sizes)
+        if available:
+            band = price_band_for(price)
+            cells[(category_id, band, '')] += 1
+            for size in product_sizes:
+                cells[(category_id, band, size)] += 1
+    ProductSize.objects.bulk_create(sizes_rows, batch_size=5000)
+    FacetCount.objects.bulk_create([
+        FacetCount(category_id=category_id, price_band=band, size=size, count=count)
+        for (category_id, band, size), count in cells.items()
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_category_product_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.CharField(max_length=20)),
+                ('size', models.CharField(blank=True, max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=10)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', 'price'], name='store_produ_availab_937d20_idx'),
+        ),
+        migrations.AddField(
+            model_name='facetcount',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='store.category'),
+        ),
+        migrations.AddField(
+            model_name='productsize',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='size_entries', to='store.product'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='facetcount',
+            unique_together={('category', 'price_band', 'size')},
+        ),
+        migrations.AddIndex(
+            model_name='productsize',
+            index=models.Index(fields=['size', 'product'], name='store_produ_size_23cc08_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productsize',
+            unique_together={('product', 'size')},
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
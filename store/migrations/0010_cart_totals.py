@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:21
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    totals = Cart.objects.annotate(
+        live_count=Coalesce(Sum('items__quantity'), 0),
+        live_subtotal=Coalesce(
+            Sum(F('items__quantity') * F('items__product__price'), output_field=money),
+            Value(Decimal('0')), output_field=money,
+        ),
+    ).values_list('pk', 'live_count', 'live_subtotal')
+    for pk, live_count, live_subtotal in totals:
+        Cart.objects.filter(pk=pk).update(item_count=live_count, subtotal=live_subtotal)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Total quantity of all items (maintained automatically)'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Sum of quantity x current price (maintained automatically)', max_digits=12),
+        ),
+        migrations.RunPython(populate_cart_totals, migrations.RunPython.noop),
+    ]
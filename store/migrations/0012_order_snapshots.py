@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+
+def populate_unit_prices(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    OrderItem.objects.filter(quantity__gt=0).update(price=ExpressionWrapper(
+        F('total') / F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_session_key_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='Sent with the checkout form so a resubmission cannot place a second order', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Unit price when the order was placed', max_digits=10),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_order_idempotency_key'),
+        ),
+        migrations.RunPython(populate_unit_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    items = OrderItem.objects.filter(order=OuterRef('pk'))
+    units = items.values('order').annotate(total=Sum('quantity')).values('total')
+    Order.objects.update(
+        item_count=Coalesce(Subquery(units, output_field=IntegerField()), Value(0)),
+        first_product_name=Coalesce(Subquery(items.order_by('pk').values('product__name')[:1]), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_task_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='first_product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='store_order_user_id_435f58_idx'),
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'permissions': [('export_order', 'Can export orders')]},
+        ),
+    ]
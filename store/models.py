@@ -1,12 +1,22 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import BooleanField, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    product_count = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text="Number of available products (maintained automatically)")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -18,6 +28,39 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('store:category_products', kwargs={'slug': self.slug})
 
+    @classmethod
+    def refresh_product_counts(cls):
+        """Recompute the stored available-product count for every category"""
+        counts = cls.objects.annotate(
+            live_count=Count('products', filter=Q(products__available=True))
+        ).values_list('pk', 'live_count', 'product_count')
+        updated = 0
+        for pk, live_count, stored_count in counts:
+            if live_count != stored_count:
+                cls.objects.filter(pk=pk).update(product_count=live_count)
+                updated += 1
+        return updated
+
+def new_arrival_cutoff():
+    """Products created at or after this moment count as new arrivals.
+
+    Truncated to the minute so queries built from it stay identical, and
+    cacheable, between requests.
+    """
+    now = timezone.now().replace(second=0, microsecond=0)
+    return now - timedelta(days=getattr(settings, 'NEW_ARRIVAL_DAYS', 30))
+
+class ProductQuerySet(models.QuerySet):
+    def new_arrivals(self):
+        """Products inside the new-arrival window, a range scan on the created_at index"""
+        return self.filter(created_at__gte=new_arrival_cutoff())
+
+    def with_new_arrival_flag(self):
+        """Annotate `new_arrival` in SQL so templates never compare dates per object"""
+        return self.annotate(new_arrival=ExpressionWrapper(
+            Q(created_at__gte=new_arrival_cutoff()), output_field=BooleanField(),
+        ))
+
 class Product(models.Model):
     SIZES = [
         ('XS', 'Extra Small'),
@@ -34,6 +77,8 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         help_text="Resized copies of the image, filled in by the image pipeline")
     sizes = models.CharField(max_length=100, help_text="Available sizes (comma-separated)")
     featured = models.BooleanField(default=False)
     available = models.BooleanField(default=True)
@@ -41,12 +86,30 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['available', 'price']),
+            # Keyset pagination walks these newest-first; SQLite cannot seek on a
+            # bare boolean filter, so `available` is checked while scanning
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['category', '-created_at', '-id']),
+            # MAX(updated_at) is the catalog's Last-Modified for conditional GETs
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted state so signal handlers can diff against it
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def get_absolute_url(self):
         return reverse('store:product_detail', kwargs={'slug': self.slug})
 
@@ -55,14 +118,86 @@ class Product(models.Model):
 
     @property
     def is_new_arrival(self):
-        """Check if product is a new arrival (created within last 30 days)"""
-        from django.utils import timezone
-        from datetime import timedelta
-        return self.created_at >= timezone.now() - timedelta(days=30)
+        """Whether the product is inside the new-arrival window.
+
+        Uses the `new_arrival` annotation from with_new_arrival_flag() when the
+        queryset provided it.
+        """
+        if 'new_arrival' in self.__dict__:
+            return self.new_arrival
+        return self.created_at >= new_arrival_cutoff()
+
+class ProductSize(models.Model):
+    """One row per size a product is offered in, so sizes can be filtered in SQL"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='size_entries')
+    size = models.CharField(max_length=10)
+
+    class Meta:
+        unique_together = ['product', 'size']
+        indexes = [models.Index(fields=['size', 'product'])]
+
+    def __str__(self):
+        return f"{self.product.name} ({self.size})"
+
+class FacetCount(models.Model):
+    """Available-product counts per (category, price band, size) cell.
+
+    Rows with an empty size count each product once; rows with a size count
+    the products offered in that size.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='facet_counts')
+    price_band = models.CharField(max_length=20)
+    size = models.CharField(max_length=10, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['category', 'price_band', 'size']
+
+    def __str__(self):
+        return f"{self.category_id}/{self.price_band}/{self.size or '*'}: {self.count}"
+
+class ProductPair(models.Model):
+    """How often two products were ordered or wishlisted together; stored in both directions"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='pairs')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'related']
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id}: {self.weight}"
+
+class ProductRecommendation(models.Model):
+    """Precomputed top neighbours of a product, read by the detail page in one lookup"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='recommendation')
+    related_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for {self.product_id}"
+
+class RecommendationRun(models.Model):
+    """High-water marks of the order and wishlist rows already folded into ProductPair"""
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    last_wishlist_item_id = models.PositiveBigIntegerField(default=0)
+    full_rebuild = models.BooleanField(default=False)
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        get_latest_by = 'pk'
+
+    def __str__(self):
+        return f"Recommendation run at {self.finished_at}"
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
+    item_count = models.PositiveIntegerField(default=0, editable=False,
+                                             help_text="Total quantity of all items (maintained automatically)")
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False,
+                                   help_text="Sum of quantity x current price (maintained automatically)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -73,11 +208,35 @@ class Cart(models.Model):
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
 
     @property
     def total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.subtotal
+
+    @classmethod
+    def refresh_totals(cls, queryset=None):
+        """Recompute stored item counts and subtotals from the cart lines.
+
+        Only carts whose stored values are wrong are written; returns how many
+        were corrected.
+        """
+        money = DecimalField(max_digits=12, decimal_places=2)
+        totals = (queryset if queryset is not None else cls.objects.all()).annotate(
+            live_count=Coalesce(Sum('items__quantity'), 0),
+            live_subtotal=Coalesce(
+                Sum(F('items__quantity') * F('items__product__price'), output_field=money),
+                Value(Decimal('0')), output_field=money,
+            ),
+        ).values_list('pk', 'live_count', 'live_subtotal', 'item_count', 'subtotal', 'user_id', 'session_key')
+        from .cart import forget_cart_count
+        updated = 0
+        for pk, live_count, live_subtotal, stored_count, stored_subtotal, user_id, session_key in totals:
+            if live_count != stored_count or live_subtotal != stored_subtotal:
+                cls.objects.filter(pk=pk).update(item_count=live_count, subtotal=live_subtotal)
+                forget_cart_count(user_id, session_key)
+                updated += 1
+        return updated
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -92,12 +251,46 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The cart totals signal diffs the new quantity against this
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The cart totals are updated by a post_save handler; keep both in one transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
     def get_total_price(self):
         return self.quantity * self.product.price
 
+class StockReservation(models.Model):
+    """Units of a product held for a cart between opening checkout and placing the order.
+
+    Holds stop counting against stock once expires_at passes.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['cart', 'product']
+        indexes = [models.Index(fields=['product', 'expires_at'])]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for cart {self.cart_id}"
+
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -130,10 +323,100 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=30, default='Placed')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                       help_text="Sent with the checkout form so a resubmission cannot place a second order")
+    # Written when the order is placed so order history can summarise it without its lines
+    item_count = models.PositiveIntegerField(default=0)
+    first_product_name = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # Order history pages walk a user's orders newest first
+            models.Index(fields=['user', '-created_at', '-id']),
+            # Exports and the admin date filters read orders by date
+            models.Index(fields=['created_at', 'id']),
+        ]
+        permissions = [
+            # Exports carry every customer's name, address and phone number
+            ('export_order', "Can export orders"),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     size = models.CharField(max_length=10, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                help_text="Unit price when the order was placed")
     total = models.DecimalField(max_digits=10, decimal_places=2)
+
+class DailySales(models.Model):
+    """Orders, units and revenue per day, kept by store.sales so reports never scan orders"""
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+
+    def __str__(self):
+        return f"Sales on {self.day}"
+
+class DailyProductSales(models.Model):
+    """Units and revenue per product per day; the category is the product's when it sold"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['day', 'product']
+        indexes = [models.Index(fields=['day', 'category'])]
+        verbose_name_plural = 'daily product sales'
+
+    def __str__(self):
+        return f"Sales of {self.product_id} on {self.day}"
+
+class RollupWatermark(models.Model):
+    """How far a rollup has read a source table, so each run only folds in new rows"""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.PositiveBigIntegerField(default=0, help_text="Highest source row id already folded in")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+class Task(models.Model):
+    """A unit of background work, claimed and run by `manage.py run_tasks`"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not claimed before this moment")
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due queued task
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['name', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
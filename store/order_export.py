@@ -0,0 +1,117 @@
+"""Order export for fulfilment, streamed so memory stays flat however many orders match.
+
+Orders are read in (created_at, id) keyset chunks, each followed by one query
+for that chunk's lines, so the export makes two queries per chunk and never
+holds more than one chunk in memory.
+"""
+import csv
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .export import Echo, ndjson_lines
+from .models import Order, OrderItem
+
+FORMATS = ('csv', 'ndjson')
+
+ORDER_FIELDS = ('id', 'created_at', 'status', 'user__username', 'full_name', 'address', 'city',
+                'postal_code', 'phone', 'payment_method', 'total_price')
+ORDER_COLUMNS = ['order_id', 'created_at', 'status', 'username', 'full_name', 'address', 'city',
+                 'postal_code', 'phone', 'payment_method', 'order_total']
+ITEM_COLUMNS = ['product_id', 'product_name', 'size', 'quantity', 'price', 'line_total']
+
+# One CSV row per order line
+COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+CHUNK_SIZE = 1000
+
+
+def orders_between(since=None, until=None, statuses=None):
+    """Orders placed at or after `since` and before `until`, optionally only in `statuses`"""
+    queryset = Order.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def _chunks(queryset, chunk_size):
+    """Lists of order value rows in (created_at, id) order, one index range scan each"""
+    queryset = queryset.order_by('created_at', 'id').values_list(*ORDER_FIELDS)
+    position = None
+    while True:
+        page = queryset
+        if position is not None:
+            t, pk = position
+            page = page.filter(Q(created_at__gte=t), Q(created_at__gt=t) | Q(id__gt=pk))
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        position = rows[-1][1], rows[-1][0]
+
+
+def order_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one dict per order in `queryset`, oldest first, with its lines under 'items'"""
+    for orders in _chunks(queryset, chunk_size):
+        items = defaultdict(list)
+        lines = OrderItem.objects.filter(order_id__in=[row[0] for row in orders]).order_by('order_id', 'id').values_list(
+            'order_id', 'product_id', 'product__name', 'size', 'quantity', 'price', 'total',
+        )
+        for order_id, product_id, product_name, size, quantity, price, total in lines:
+            items[order_id].append({
+                'product_id': product_id,
+                'product_name': product_name,
+                'size': size,
+                'quantity': quantity,
+                'price': str(price),
+                'line_total': str(total),
+            })
+        for pk, created_at, status, username, full_name, address, city, postal_code, phone, payment_method, total_price in orders:
+            yield {
+                'order_id': pk,
+                'created_at': created_at.isoformat(),
+                'status': status,
+                'username': username,
+                'full_name': full_name,
+                'address': address,
+                'city': city,
+                'postal_code': postal_code,
+                'phone': phone,
+                'payment_method': payment_method,
+                'order_total': str(total_price),
+                'items': items.pop(pk, []),
+            }
+
+
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    """Customer-entered text as a literal cell, never a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(orders):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for order in orders:
+        head = [_cell(order[column]) for column in ORDER_COLUMNS]
+        if not order['items']:
+            yield writer.writerow(head + [''] * len(ITEM_COLUMNS))
+        for item in order['items']:
+            yield writer.writerow(head + [_cell(item[column]) for column in ITEM_COLUMNS])
+
+
+def render_lines(orders, export_format):
+    if export_format == 'csv':
+        return csv_lines(orders)
+    return ndjson_lines(orders)
@@ -0,0 +1,116 @@
+import hashlib
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from . import shared_cache
+from .cart import get_cart_count
+
+CSRF_PLACEHOLDER = '__PAGE_CACHE_CSRF__'
+CART_COUNT_PLACEHOLDER = '__PAGE_CACHE_CART_COUNT__'
+
+_CSRF_META_RE = re.compile(r'<meta name="csrf-token" content="([^"]+)">')
+_CART_BADGE_RE = re.compile(r'(id="cart-count">)\d+(<)')
+
+TAG_VERSION_PREFIX = 'page-cache-tag:'
+
+
+def _timeout():
+    # Tag versions only invalidate pages in the process that bumped them unless the cache is shared
+    return shared_cache.timeout(getattr(settings, 'PAGE_CACHE_TIMEOUT', 600))
+
+
+def tag_version(tag):
+    """Current version of a tag; other caches can key on it to share invalidation"""
+    return cache.get(TAG_VERSION_PREFIX + tag, 0)
+
+
+def _tag_versions(tags):
+    keys = [TAG_VERSION_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    return [str(versions.get(key, 0)) for key in keys]
+
+
+def invalidate(*tags):
+    """Purge every cached page depending on any of the given tags.
+
+    Pages are keyed on the current version of each of their tags, so bumping
+    a version makes the old entries unreachable; they then age out.
+    """
+    for tag in tags:
+        key = TAG_VERSION_PREFIX + tag
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+
+def _cache_key(request, tags):
+    raw = '|'.join([request.get_full_path()] + tags + _tag_versions(tags))
+    return 'page-cache:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pending flash messages are rendered into the page as toasts
+    return len(messages.get_messages(request)) == 0
+
+
+def _punch_holes(content):
+    """Replace the per-request parts of a rendered page with placeholders"""
+    match = _CSRF_META_RE.search(content)
+    if match:
+        content = content.replace(match.group(1), CSRF_PLACEHOLDER)
+    return _CART_BADGE_RE.sub(r'\g<1>' + CART_COUNT_PLACEHOLDER + r'\g<2>', content)
+
+
+def _fill_holes(request, content):
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    if CART_COUNT_PLACEHOLDER in content:
+        content = content.replace(CART_COUNT_PLACEHOLDER, str(get_cart_count(request)))
+    return content
+
+
+def cache_anonymous_page(*tags):
+    """Serve anonymous GETs of a catalog page from the cache.
+
+    Tags name what the page depends on and may use the view's URL kwargs,
+    e.g. 'category:{slug}'. The CSRF token and the cart badge are stored as
+    placeholders and filled in per request, so a cached page is never shared
+    with another visitor's token or cart.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            page_tags = [tag.format(**kwargs) for tag in tags]
+            key = _cache_key(request, page_tags)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(_fill_holes(request, content), content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            if response.status_code == 200 and not response.streaming:
+                content = _punch_holes(response.content.decode(response.charset))
+                cache.set(key, (content, response['Content-Type']), _timeout())
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+COUNT_CACHE_TIMEOUT = 300
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    """Serialise a cursor position dict into an opaque URL-safe token"""
+    raw = json.dumps(position, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if position.get('d') not in ('next', 'prev', 'last'):
+            raise ValueError(token)
+        if position['d'] != 'last':
+            position['t'] = parse_datetime(position['t'])
+            position['id'] = int(position['id'])
+            if position['t'] is None:
+                raise ValueError(token)
+        position['n'] = max(int(position.get('n', 1)), 1)
+        return position
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing; mirrors the parts of Page templates use"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor_for(self, obj, direction, number):
+        return encode_cursor({'d': direction, 't': obj.created_at.isoformat(), 'id': obj.pk, 'n': number})
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self._cursor_for(self.object_list[-1], 'next', self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self._cursor_for(self.object_list[0], 'prev', self.number - 1)
+
+    @property
+    def last_cursor(self):
+        return encode_cursor({'d': 'last', 'n': self.paginator.num_pages})
+
+
+class KeysetPaginator:
+    """Cursor pagination over (created_at, id), newest first.
+
+    Each page is an index range scan from the cursor position instead of an
+    OFFSET, so deep pages cost the same as the first one. The total used for
+    the page-number UI comes from `count` when the caller already knows it,
+    otherwise from a short-lived cached COUNT.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.per_page = per_page
+        self._count = count
+
+    @cached_property
+    def count(self):
+        count = self._count() if callable(self._count) else self._count
+        if count is not None:
+            return count
+        key = 'keyset-count:' + hashlib.md5(str(self.queryset.query).encode()).hexdigest()
+        return cache.get_or_set(key, self.queryset.count, COUNT_CACHE_TIMEOUT)
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def page(self, token=None):
+        position = decode_cursor(token) if token else {'d': 'first', 'n': 1}
+        direction = position['d']
+        queryset = self.queryset
+
+        # The redundant leading bound on created_at lets SQLite seek the index
+        # rather than scanning it to evaluate the OR
+        if direction == 'next':
+            t, pk = position['t'], position['id']
+            queryset = queryset.filter(Q(created_at__lte=t), Q(created_at__lt=t) | Q(id__lt=pk))
+        elif direction == 'prev':
+            t, pk = position['t'], position['id']
+            queryset = queryset.filter(Q(created_at__gte=t), Q(created_at__gt=t) | Q(id__gt=pk))
+
+        if direction in ('prev', 'last'):
+            # Walk backwards from the anchor, then restore newest-first order
+            rows = list(queryset.reverse()[:self.per_page + 1])
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_previous, has_next = more, direction == 'prev'
+        else:
+            rows = list(queryset[:self.per_page + 1])
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous, has_next = direction == 'next', more
+
+        number = position['n']
+        if not has_previous:
+            number = 1
+        return KeysetPage(rows, self, number, has_next, has_previous)
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .cart import forget_cart_count
+from .locking import write_transaction
+from .models import Cart, CartItem, Wishlist, WishlistItem
+
+CHUNK_SIZE = 500
+
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+def _live_session_keys():
+    """Unexpired session keys, or None when sessions are not stored in the database"""
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return None
+    return Session.objects.filter(expire_date__gt=timezone.now()).values('session_key')
+
+
+def _session_gone():
+    condition = Q(session_key__isnull=True) | Q(session_key='')
+    live = _live_session_keys()
+    if live is not None:
+        condition |= ~Q(session_key__in=live)
+    return condition
+
+
+def abandoned_carts(idle_days):
+    """Guest carts whose session is gone or that nobody touched for idle_days"""
+    cutoff = timezone.now() - timedelta(days=idle_days)
+    return Cart.objects.filter(user__isnull=True).filter(_session_gone() | Q(updated_at__lt=cutoff))
+
+
+def abandoned_wishlists(idle_days):
+    """Guest wishlists whose session is gone or that gained no item for idle_days"""
+    cutoff = timezone.now() - timedelta(days=idle_days)
+    recent_items = WishlistItem.objects.filter(wishlist=OuterRef('pk'), created_at__gte=cutoff)
+    return Wishlist.objects.filter(user__isnull=True).filter(
+        _session_gone() | (Q(created_at__lt=cutoff) & ~Exists(recent_items))
+    )
+
+
+def _delete_cart_chunk(ids):
+    # Raw delete: the carts go too, so the per-line totals handlers have nothing to keep in step
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {CartItem._meta.db_table} WHERE cart_id IN ({placeholders})", ids)
+        lines = cursor.rowcount
+    Cart.objects.filter(pk__in=ids).delete()
+    return lines
+
+
+def _delete_wishlist_chunk(ids):
+    lines, _ = WishlistItem.objects.filter(wishlist_id__in=ids).delete()
+    Wishlist.objects.filter(pk__in=ids).delete()
+    return lines
+
+
+def _purge(queryset, delete_chunk, chunk_size, pause, on_chunk=None):
+    """Delete queryset in pk order, one short transaction per chunk.
+
+    Returns (parents deleted, child rows deleted). Each chunk only holds the
+    write lock for its own few statements, so checkout writes can slip in
+    between chunks; `pause` seconds of sleep widens that gap.
+    """
+    parents = children = 0
+    last_pk = 0
+    while True:
+        with write_transaction():
+            rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'session_key')[:chunk_size])
+            if not rows:
+                break
+            ids = [pk for pk, _session_key in rows]
+            children += delete_chunk(ids)
+        parents += len(ids)
+        last_pk = ids[-1]
+        if on_chunk:
+            on_chunk(rows)
+        if pause:
+            time.sleep(pause)
+    return parents, children
+
+
+def purge_abandoned(idle_days=None, chunk_size=CHUNK_SIZE, pause=0):
+    """Delete abandoned guest carts and wishlists with their lines.
+
+    Returns a dict of deleted row counts per table.
+    """
+    if idle_days is None:
+        idle_days = getattr(settings, 'ABANDONED_CART_DAYS', 30)
+
+    def forget_badges(rows):
+        for _pk, session_key in rows:
+            forget_cart_count(session_key=session_key)
+
+    carts, cart_items = _purge(abandoned_carts(idle_days), _delete_cart_chunk, chunk_size, pause, forget_badges)
+    wishlists, wishlist_items = _purge(abandoned_wishlists(idle_days), _delete_wishlist_chunk, chunk_size, pause)
+    return {
+        'carts': carts,
+        'cart_items': cart_items,
+        'wishlists': wishlists,
+        'wishlist_items': wishlist_items,
+    }
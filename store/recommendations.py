@@ -0,0 +1,245 @@
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .locking import write_transaction
+from .models import (Order, OrderItem, Product, ProductPair, ProductRecommendation,
+                     RecommendationRun, WishlistItem)
+
+# Neighbours stored per product; more than are shown so delisted items can be skipped
+TOP_K = 12
+SHOWN = 3
+
+# Buying together is a stronger signal than wishlisting together
+ORDER_WEIGHT = 2
+WISHLIST_WEIGHT = 1
+
+CHUNK_SIZE = 500
+
+# Orders and wishlist items folded per staging statement; each statement only
+# holds SQLite's shared read lock while it runs, so writers get in between
+ORDER_CHUNK_SIZE = 5000
+WISHLIST_CHUNK_SIZE = 20000
+
+# Connection-local scratch table; SQLite keeps TEMP tables outside the main
+# database, so filling it never takes the write lock
+STAGING_TABLE = 'recommendation_pair_staging'
+
+
+def _id_ranges(first_id, last_id, chunk_size):
+    return [(start, min(start + chunk_size, last_id)) for start in range(first_id, last_id, chunk_size)]
+
+
+def _create_staging_sql():
+    return f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            product_id integer NOT NULL,
+            related_id integer NOT NULL,
+            weight integer NOT NULL,
+            PRIMARY KEY (product_id, related_id)
+        )
+    """
+
+
+def _stage_order_pairs_sql():
+    """Co-occurrences within the orders with first_id < id <= last_id, added to the staging table.
+
+    Every (order, product) line is self-joined on its order inside the
+    database, so millions of lines never reach Python.
+    """
+    order_items = OrderItem._meta.db_table
+    return f"""
+        WITH order_lines AS (
+            SELECT DISTINCT order_id, product_id FROM {order_items}
+            WHERE order_id > %s AND order_id <= %s
+        )
+        INSERT INTO {STAGING_TABLE} (product_id, related_id, weight)
+        SELECT a.product_id, b.product_id, COUNT(*) * %s
+        FROM order_lines a JOIN order_lines b
+            ON a.order_id = b.order_id AND a.product_id <> b.product_id
+        WHERE true
+        GROUP BY a.product_id, b.product_id
+        ON CONFLICT (product_id, related_id) DO UPDATE SET weight = {STAGING_TABLE}.weight + excluded.weight
+    """
+
+
+def _stage_wishlist_pairs_sql():
+    """Wishlist co-occurrences whose newer item has first_id < id <= last_id, added to the staging table.
+
+    Attributing each pair to its newer item counts it exactly once however
+    the item ids are split into chunks, and a pair is new as soon as either
+    of its items is.
+    """
+    wishlist_items = WishlistItem._meta.db_table
+    return f"""
+        WITH pairs AS (
+            SELECT a.product_id AS product_id, b.product_id AS related_id
+            FROM {wishlist_items} a JOIN {wishlist_items} b
+                ON a.wishlist_id = b.wishlist_id AND a.product_id <> b.product_id
+            WHERE a.id > %s AND a.id <= %s AND b.id < a.id
+            UNION ALL
+            SELECT a.product_id, b.product_id
+            FROM {wishlist_items} b JOIN {wishlist_items} a
+                ON a.wishlist_id = b.wishlist_id AND a.product_id <> b.product_id
+            WHERE b.id > %s AND b.id <= %s AND a.id < b.id
+        )
+        INSERT INTO {STAGING_TABLE} (product_id, related_id, weight)
+        SELECT product_id, related_id, COUNT(*) * %s FROM pairs
+        WHERE true
+        GROUP BY product_id, related_id
+        ON CONFLICT (product_id, related_id) DO UPDATE SET weight = {STAGING_TABLE}.weight + excluded.weight
+    """
+
+
+def _merge_staged_sql():
+    """Add the staged weights to ProductPair"""
+    pairs = ProductPair._meta.db_table
+    return f"""
+        INSERT INTO {pairs} (product_id, related_id, weight)
+        SELECT product_id, related_id, weight FROM {STAGING_TABLE}
+        WHERE weight > 0
+        ORDER BY product_id, related_id
+        ON CONFLICT (product_id, related_id) DO UPDATE SET weight = {pairs}.weight + excluded.weight
+    """
+
+
+def _replace_with_staged_sql():
+    """Make ProductPair equal to the staged weights, writing only the pairs that differ.
+
+    A periodic full rebuild mostly finds the weights it already has, so this
+    keeps the write transaction far shorter than emptying and refilling it.
+    """
+    pairs = ProductPair._meta.db_table
+    return [
+        f"""
+        DELETE FROM {pairs} WHERE NOT EXISTS (
+            SELECT 1 FROM {STAGING_TABLE} s
+            WHERE s.product_id = {pairs}.product_id AND s.related_id = {pairs}.related_id AND s.weight > 0
+        )
+        """,
+        f"""
+        INSERT INTO {pairs} (product_id, related_id, weight)
+        SELECT product_id, related_id, weight FROM {STAGING_TABLE}
+        WHERE weight > 0
+        ORDER BY product_id, related_id
+        ON CONFLICT (product_id, related_id) DO UPDATE SET weight = excluded.weight
+        WHERE {pairs}.weight <> excluded.weight
+        """,
+    ]
+
+
+def _stage(bounds):
+    """Fill the staging table with the co-occurrences between the previous run and `bounds`"""
+    last_order_id, max_order_id, last_wishlist_item_id, max_wishlist_item_id = bounds
+    with connection.cursor() as cursor:
+        cursor.execute(_create_staging_sql())
+        cursor.execute(f"DELETE FROM {STAGING_TABLE}")
+        for first_id, last_id in _id_ranges(last_order_id, max_order_id, ORDER_CHUNK_SIZE):
+            cursor.execute(_stage_order_pairs_sql(), [first_id, last_id, ORDER_WEIGHT])
+        for first_id, last_id in _id_ranges(last_wishlist_item_id, max_wishlist_item_id, WISHLIST_CHUNK_SIZE):
+            cursor.execute(_stage_wishlist_pairs_sql(), [first_id, last_id, first_id, last_id, WISHLIST_WEIGHT])
+
+
+def _bounds(previous):
+    """(last order id, newest order id, last wishlist item id, newest wishlist item id) for a run after `previous`.
+
+    The upper bounds leave rows added while the run executes to the next one.
+    """
+    return (
+        previous.last_order_id if previous else 0,
+        Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+        previous.last_wishlist_item_id if previous else 0,
+        WishlistItem.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+    )
+
+
+def _store_top_neighbours(product_ids, top_k):
+    """Rewrite ProductRecommendation for the given products from their heaviest pairs, one short transaction per chunk"""
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        with write_transaction():
+            ranked = ProductPair.objects.filter(product_id__in=chunk).annotate(
+                rank=Window(RowNumber(), partition_by=F('product_id'),
+                            order_by=[F('weight').desc(), F('related_id').asc()]),
+            ).filter(rank__lte=top_k).order_by('product_id', 'rank').values_list('product_id', 'related_id')
+
+            neighbours = {pk: [] for pk in chunk}
+            for product_id, related_id in ranked:
+                neighbours[product_id].append(related_id)
+            now = timezone.now()
+            ProductRecommendation.objects.bulk_create(
+                [ProductRecommendation(product_id=pk, related_ids=ids, updated_at=now) for pk, ids in neighbours.items()],
+                update_conflicts=True, unique_fields=['product'], update_fields=['related_ids', 'updated_at'],
+            )
+
+
+def build(full=False, top_k=TOP_K):
+    """Fold orders and wishlists into the co-occurrence table and refresh top-K lists.
+
+    Incremental runs only read orders and wishlist items added since the last
+    run. Wishlist removals and deleted orders are only reflected by a full
+    rebuild, which should run periodically. Returns (pairs stored, products
+    refreshed).
+
+    The pairs are computed into a staging table in short chunked statements;
+    the write lock is only held to merge them into ProductPair and record the
+    run. If another run finished meanwhile, the staged pairs overlap it and
+    are recomputed from its bounds instead of being merged.
+    """
+    from . import page_cache
+
+    try:
+        while True:
+            with transaction.atomic():
+                previous = RecommendationRun.objects.order_by('-pk').first()
+                bounds = _bounds(None if full else previous)
+            _stage(bounds)
+            with write_transaction():
+                latest = RecommendationRun.objects.order_by('-pk').first()
+                if full or latest == previous:
+                    with connection.cursor() as cursor:
+                        for sql in _replace_with_staged_sql() if full else [_merge_staged_sql()]:
+                            cursor.execute(sql)
+                    RecommendationRun.objects.create(
+                        last_order_id=bounds[1], last_wishlist_item_id=bounds[3], full_rebuild=full,
+                    )
+                    break
+        if full:
+            product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT DISTINCT product_id FROM {STAGING_TABLE} ORDER BY product_id")
+                product_ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+    _store_top_neighbours(product_ids, top_k)
+    if product_ids:
+        page_cache.invalidate('recommendations')
+    return ProductPair.objects.count(), len(product_ids)
+
+
+def recommended_products(product, limit=SHOWN):
+    """Customers-also-bought items for a product, topped up from its category for cold starts"""
+    related_ids = ProductRecommendation.objects.filter(product_id=product.pk).values_list(
+        'related_ids', flat=True
+    ).first() or []
+
+    chosen = []
+    if related_ids:
+        by_id = Product.objects.filter(pk__in=related_ids, available=True).select_related(
+            'category'
+        ).with_new_arrival_flag().in_bulk()
+        chosen = [by_id[pk] for pk in related_ids if pk in by_id][:limit]
+
+    if len(chosen) < limit:
+        chosen += list(
+            Product.objects.filter(category_id=product.category_id, available=True)
+            .exclude(pk__in=[product.pk] + [p.pk for p in chosen])
+            .select_related('category')
+            .with_new_arrival_flag()
+            .order_by('-created_at', '-id')[:limit - len(chosen)]
+        )
+    return chosen
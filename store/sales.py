@@ -0,0 +1,152 @@
+"""Daily sales rollups, so reporting reads a few rows per day instead of scanning orders.
+
+DailySales keeps orders, units and revenue per day and DailyProductSales the
+same per product. Orders are folded in by id behind a watermark: `roll_up`
+adds every order placed since the last run (the task queue runs it after each
+checkout), and `rebuild` recomputes history from scratch in parallel chunks.
+Every fold adds to the existing rows, so chunks can land in any order.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+
+from .locking import write_transaction
+from .models import DailyProductSales, DailySales, Order, OrderItem, RollupWatermark
+
+WATERMARK = 'sales'
+
+# Orders folded per transaction by roll_up, and per worker chunk by rebuild
+CHUNK_SIZE = 1000
+REBUILD_CHUNK_SIZE = 20000
+
+
+def _add_daily_sales_sql():
+    table = DailySales._meta.db_table
+    return f"""
+        INSERT INTO {table} (day, orders, units, revenue) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (day) DO UPDATE SET
+            orders = {table}.orders + excluded.orders,
+            units = {table}.units + excluded.units,
+            revenue = {table}.revenue + excluded.revenue
+    """
+
+
+def _add_product_sales_sql():
+    table = DailyProductSales._meta.db_table
+    return f"""
+        INSERT INTO {table} (day, product_id, category_id, units, revenue) VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            category_id = excluded.category_id,
+            units = {table}.units + excluded.units,
+            revenue = {table}.revenue + excluded.revenue
+    """
+
+
+def _aggregate(first_id, last_id):
+    """Per-day and per-(day, product) totals of the orders with first_id < id <= last_id"""
+    days = (
+        Order.objects.filter(pk__gt=first_id, pk__lte=last_id)
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(orders=Count('pk'), units=Sum('item_count'), revenue=Sum('total_price'))
+        .values_list('day', 'orders', 'units', 'revenue')
+    )
+    products = (
+        OrderItem.objects.filter(order_id__gt=first_id, order_id__lte=last_id)
+        .annotate(day=TruncDate('order__created_at')).values('day', 'product_id', 'product__category_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('total'))
+        .values_list('day', 'product_id', 'product__category_id', 'units', 'revenue')
+    )
+    return list(days), list(products)
+
+
+def _add(days, products):
+    with connection.cursor() as cursor:
+        if days:
+            cursor.executemany(_add_daily_sales_sql(), days)
+        if products:
+            cursor.executemany(_add_product_sales_sql(), products)
+
+
+def _watermark():
+    watermark, _created = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+    return watermark
+
+
+def roll_up(chunk_size=CHUNK_SIZE):
+    """Fold the orders placed since the last run into the rollups; returns how many.
+
+    The watermark row is locked for each chunk, so concurrent runs take turns
+    instead of counting an order twice. Orders are committed in id order under
+    SQLite's single writer, so nothing below the watermark can still appear.
+    """
+    folded = 0
+    while True:
+        with write_transaction():
+            watermark = _watermark()
+            ids = list(
+                Order.objects.filter(pk__gt=watermark.position).order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return folded
+            _add(*_aggregate(watermark.position, ids[-1]))
+            watermark.position = ids[-1]
+            watermark.save(update_fields=['position', 'updated_at'])
+        folded += len(ids)
+
+
+def _rebuild_chunk(bounds):
+    # Runs in a worker thread with its own connection. The aggregate read,
+    # where the time goes, runs outside the write transaction so chunks overlap.
+    try:
+        days, products = _aggregate(*bounds)
+        with transaction.atomic():
+            _add(days, products)
+        return sum(row[1] for row in days)
+    finally:
+        connection.close()
+
+
+def rebuild(workers=4, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute the rollups from every order; returns how many were folded in.
+
+    The tables are emptied and the watermark moved to the newest order in one
+    transaction, so orders placed meanwhile are left to roll_up. The history
+    below it is split into order id ranges aggregated by `workers` threads.
+    """
+    with write_transaction():
+        watermark = _watermark()
+        high = Order.objects.aggregate(high=Max('pk'))['high'] or 0
+        DailyProductSales.objects.all().delete()
+        DailySales.objects.all().delete()
+        watermark.position = high
+        watermark.save(update_fields=['position', 'updated_at'])
+
+    ranges = [(start, min(start + chunk_size, high)) for start in range(0, high, chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sales-rebuild') as pool:
+        return sum(pool.map(_rebuild_chunk, ranges))
+
+
+def report(days, top=10):
+    """Totals, revenue by category and best-selling products over a DailySales queryset.
+
+    Only the rollup tables are read.
+    """
+    days = days.order_by()
+    products = DailyProductSales.objects.filter(day__in=days.values('day'))
+    totals = days.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+    if totals['orders']:
+        totals['average_order'] = totals['revenue'] / totals['orders']
+    return {
+        'totals': totals,
+        'categories': list(
+            products.values('category__name').annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')
+        ),
+        'products': list(
+            products.values('product_id', 'product__name').annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:top]
+        ),
+    }
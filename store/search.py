@@ -0,0 +1,158 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+FTS_TABLE = 'store_product_fts'
+
+# bm25 column weights for (name, description, category_name)
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported():
+    """FTS5 is an SQLite feature; other backends fall back to icontains"""
+    return connection.vendor == 'sqlite'
+
+
+def create_index(rebuild=False):
+    """Create the FTS5 table if it is missing, filling it when newly created"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+        )
+        exists = cursor.fetchone() is not None
+        if not exists:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "name, description, category_name, tokenize = 'porter unicode61')"
+            )
+    if rebuild or not exists:
+        rebuild_index()
+    return not exists
+
+
+def rebuild_index():
+    """Re-index every available product from scratch"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category_name) "
+            "SELECT p.id, p.name, p.description, c.name "
+            "FROM store_product p INNER JOIN store_category c ON c.id = p.category_id "
+            "WHERE p.available"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_product(product, category_name=None):
+    """Insert or refresh a single product's row; unavailable products are dropped"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        if product.available:
+            if category_name is None:
+                category_name = product.category.name
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description, category_name) "
+                "VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.description, category_name],
+            )
+
+
+def remove_product(product_id):
+    """Drop a product from the index"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rename_category(category):
+    """Propagate a category name change to its products' index rows"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET category_name = %s "
+            "WHERE rowid IN (SELECT id FROM store_product WHERE category_id = %s)",
+            [category.name, category.pk],
+        )
+
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 query: every term required, last one as a prefix"""
+    terms = _TERM_RE.findall(text or '')
+    if not terms:
+        return ''
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class SearchResults:
+    """Lazy, sliceable result set so Django's Paginator only fetches one page"""
+
+    def __init__(self, text):
+        self.text = text
+        self.match = build_match_query(text)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            elif is_supported():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.match]
+                    )
+                    self._count = cursor.fetchone()[0]
+            else:
+                self._count = self._fallback_queryset().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            stop = key.stop if key.stop is not None else self.count()
+            return self._fetch(start, max(stop - start, 0))
+        results = self._fetch(key, 1)
+        if not results:
+            raise IndexError(key)
+        return results[0]
+
+    def _fetch(self, offset, limit):
+        if not self.match or limit == 0:
+            return []
+        if not is_supported():
+            return list(self._fallback_queryset()[offset:offset + limit])
+        weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s",
+                [self.match, limit, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        products = Product.objects.select_related('category').with_new_arrival_flag().in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def _fallback_queryset(self):
+        queryset = Product.objects.filter(available=True).select_related('category')
+        for term in _TERM_RE.findall(self.text or ''):
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term)
+            )
+        return queryset
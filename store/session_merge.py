@@ -0,0 +1,118 @@
+from django.db import connection
+from django.utils import timezone
+
+from . import guest_cart
+from .cart import forget_cart_count
+from .locking import write_transaction
+from .models import Cart, CartItem, Wishlist, WishlistItem
+
+
+def _merge_cart_lines_sql(source_count):
+    """Fold every line of the session carts into the user's cart in one statement.
+
+    Lines are summed per (product, size) before the insert, and a line the user
+    already has is incremented by the session quantity.
+    """
+    table = CartItem._meta.db_table
+    placeholders = ', '.join(['%s'] * source_count)
+    return f"""
+        INSERT INTO {table} (cart_id, product_id, size, quantity, created_at)
+        SELECT %s, product_id, size, SUM(quantity), MIN(created_at) FROM {table}
+        WHERE cart_id IN ({placeholders})
+        GROUP BY product_id, size
+        ON CONFLICT (cart_id, product_id, size) DO UPDATE SET quantity = {table}.quantity + excluded.quantity
+    """
+
+
+def _merge_wishlist_items_sql(source_count):
+    table = WishlistItem._meta.db_table
+    placeholders = ', '.join(['%s'] * source_count)
+    return f"""
+        INSERT INTO {table} (wishlist_id, product_id, created_at)
+        SELECT %s, product_id, MIN(created_at) FROM {table}
+        WHERE wishlist_id IN ({placeholders})
+        GROUP BY product_id
+        ON CONFLICT (wishlist_id, product_id) DO NOTHING
+    """
+
+
+def merge_session_cart(session_key, user):
+    """Move an anonymous session's cart into the user's cart.
+
+    If the user has no cart yet the session cart is simply handed over;
+    otherwise its lines are merged with set-based SQL and the session cart is
+    deleted. The query count does not depend on the number of lines.
+    """
+    session_cart_ids = list(Cart.objects.filter(session_key=session_key, user__isnull=True).values_list('pk', flat=True))
+    if not session_cart_ids:
+        return
+    with write_transaction():
+        user_cart_id = Cart.objects.select_for_update().filter(user=user).order_by('pk').values_list(
+            'pk', flat=True
+        ).first()
+        if user_cart_id is None:
+            user_cart_id = session_cart_ids.pop(0)
+            Cart.objects.filter(pk=user_cart_id).update(user=user, session_key=None, updated_at=timezone.now())
+        if session_cart_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(_merge_cart_lines_sql(len(session_cart_ids)), [user_cart_id] + session_cart_ids)
+                # One statement instead of the ORM's per-line delete signals; the
+                # lines were folded in above and must not move any totals again
+                placeholders = ', '.join(['%s'] * len(session_cart_ids))
+                cursor.execute(f"DELETE FROM {CartItem._meta.db_table} WHERE cart_id IN ({placeholders})",
+                               session_cart_ids)
+            Cart.objects.filter(pk__in=session_cart_ids).delete()
+            Cart.refresh_totals(Cart.objects.filter(pk=user_cart_id))
+    forget_cart_count(session_key=session_key)
+    forget_cart_count(user_id=user.pk)
+
+
+def merge_session_wishlist(session_key, user):
+    """Move an anonymous session's wishlist into the user's, keeping each product once"""
+    session_wishlist_ids = list(
+        Wishlist.objects.filter(session_key=session_key, user__isnull=True).values_list('pk', flat=True)
+    )
+    if not session_wishlist_ids:
+        return
+    with write_transaction():
+        wishlist_id = Wishlist.objects.filter(user=user).order_by('pk').values_list('pk', flat=True).first()
+        if wishlist_id is None:
+            wishlist_id = session_wishlist_ids.pop(0)
+            Wishlist.objects.filter(pk=wishlist_id).update(user=user, session_key=None)
+        if session_wishlist_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(_merge_wishlist_items_sql(len(session_wishlist_ids)),
+                               [wishlist_id] + session_wishlist_ids)
+            Wishlist.objects.filter(pk__in=session_wishlist_ids).delete()
+
+
+def merge_guest_cart(request, user):
+    """Write a cache or cookie guest cart into the user's cart with one upsert, then empty it"""
+    cart = guest_cart.load(request)
+    lines = cart.lines
+    if not lines:
+        return
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    table = CartItem._meta.db_table
+    with write_transaction():
+        user_cart, _created = Cart.objects.get_or_create(user=user)
+        values = []
+        for line in lines:
+            values += [user_cart.pk, line.product_id, line.size, line.quantity, created_at]
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (cart_id, product_id, size, quantity, created_at)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(lines))}
+                ON CONFLICT (cart_id, product_id, size) DO UPDATE SET quantity = {table}.quantity + excluded.quantity
+            """, values)
+        Cart.refresh_totals(Cart.objects.filter(pk=user_cart.pk))
+    forget_cart_count(user_id=user.pk)
+    cart.clear()
+
+
+def merge_session_data(session_key, user):
+    """Carry the cart and wishlist a visitor built before logging in over to their account"""
+    if not session_key:
+        return
+    merge_session_cart(session_key, user)
+    merge_session_wishlist(session_key, user)
@@ -0,0 +1,40 @@
+"""Whether the default cache is shared by every server process.
+
+Cart badge counts and the page cache's tag versions are written by the
+process that handled the change. With a per-process backend such as
+LocMemCache (the default in settings) other processes never see those
+writes, so both fall back to LOCAL_TIMEOUT to bound how long a stale badge
+or page can be served. Point CACHES at Redis or Memcached to get the long
+timeouts and immediate invalidation everywhere.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Seconds cached badges and pages may live in a per-process cache
+LOCAL_TIMEOUT = 60
+
+
+def is_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PER_PROCESS_BACKENDS
+
+
+def timeout(shared_timeout):
+    """`shared_timeout` when every process sees the same cache, otherwise at most LOCAL_TIMEOUT"""
+    return shared_timeout if is_shared() else min(shared_timeout, LOCAL_TIMEOUT)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+    return [Warning(
+        "The default cache is local to each process, so cart badges and cached pages "
+        "only refresh in the process that saw the change.",
+        hint=f"Use a shared backend such as Redis or Memcached; until then those entries expire after {LOCAL_TIMEOUT}s.",
+        id='store.W001',
+    )]
@@ -0,0 +1,229 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import facets, images, page_cache, search, tasks
+from .cart import forget_cart_count, remember_cart_count, totals_suspended
+from .models import Cart, CartItem, Category, Order, Product
+
+# Persisted Product fields the derived data (counts, facets, search) depends on
+TRACKED_FIELDS = ('category_id', 'available', 'price', 'sizes')
+
+# Also read before saving an instance that was not loaded from the database
+PAGE_FIELDS = ('slug', 'featured', 'image')
+
+
+def _adjust_product_count(category_id, delta):
+    """Shift a category's stored product count by delta inside the database"""
+    if delta > 0:
+        Category.objects.filter(pk=category_id).update(product_count=F('product_count') + delta)
+    elif delta < 0:
+        Category.objects.filter(pk=category_id, product_count__gte=-delta).update(
+            product_count=F('product_count') + delta
+        )
+
+
+def _persisted_state(product):
+    """Return the tracked fields as last loaded from or written to the database"""
+    loaded = getattr(product, '_loaded_values', None)
+    if loaded is None or any(field not in loaded for field in TRACKED_FIELDS):
+        return None
+    return {field: loaded[field] for field in TRACKED_FIELDS}
+
+
+def _current_state(product):
+    return {field: getattr(product, field) for field in TRACKED_FIELDS}
+
+
+def _facet_cells(state):
+    return facets.product_cells(state['category_id'], state['price'], state['sizes'], state['available'])
+
+
+def _update_category_counts(old_state, new_state):
+    """Keep Category.product_count in step with product creates and edits"""
+    old_key = (old_state['category_id'], old_state['available']) if old_state else None
+    new_key = (new_state['category_id'], new_state['available'])
+    if old_key == new_key:
+        return
+    if old_state and old_state['available']:
+        _adjust_product_count(old_state['category_id'], -1)
+    if new_state['available']:
+        _adjust_product_count(new_state['category_id'], 1)
+
+
+@receiver(pre_save, sender=Product)
+def load_persisted_state(sender, instance, raw=False, **kwargs):
+    """Read the stored row of a product built by hand (e.g. Product(pk=...)) so its save can be diffed"""
+    if raw or instance.pk is None or _persisted_state(instance) is not None:
+        return
+    stored = Product.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS, *PAGE_FIELDS).first()
+    if stored is not None:
+        instance._loaded_values = {**(getattr(instance, '_loaded_values', None) or {}), **stored}
+
+
+@receiver(post_save, sender=Product)
+def update_derived_data_on_save(sender, instance, created, raw=False, **kwargs):
+    """Propagate a product save to stored counts, facets and the search index"""
+    if raw:
+        return
+
+    new_state = _current_state(instance)
+    # Only missing when the row did not exist before this save
+    old_state = None if created else _persisted_state(instance)
+
+    _update_category_counts(old_state, new_state)
+    facets.sync_product_sizes(instance, old_state['sizes'] if old_state else None)
+    facets.apply_cell_changes(_facet_cells(old_state) if old_state else [], _facet_cells(new_state))
+
+    search.index_product(instance)
+    if old_state and old_state['price'] != new_state['price']:
+        # Cart subtotals are priced at the current product price
+        Cart.refresh_totals(Cart.objects.filter(pk__in=CartItem.objects.filter(product=instance).values('cart_id')))
+    _schedule_image_derivatives(instance, getattr(instance, '_loaded_values', None), created)
+    _invalidate_product_pages(instance, getattr(instance, '_loaded_values', None), old_state != new_state)
+
+    # Saving the same instance again must diff against what was just written
+    instance._loaded_values = {
+        field.attname: getattr(instance, field.attname) for field in Product._meta.concrete_fields
+    }
+
+
+@receiver(post_delete, sender=Product)
+def update_derived_data_on_delete(sender, instance, **kwargs):
+    """Drop a deleted product from stored counts, facets and the search index"""
+    state = _persisted_state(instance) or _current_state(instance)
+    if state['available']:
+        _adjust_product_count(state['category_id'], -1)
+    facets.apply_cell_changes(_facet_cells(state), [])
+    search.remove_product(instance.pk)
+    _invalidate_product_pages(instance, getattr(instance, '_loaded_values', None), True)
+
+
+def _schedule_image_derivatives(product, loaded, created):
+    """Build resized copies off the request path whenever a new image is uploaded"""
+    if not product.image:
+        return
+    if created or loaded is None or loaded.get('image') != product.image.name:
+        images.schedule_derivatives(product.pk)
+
+
+def _invalidate_product_pages(product, loaded, listings_changed):
+    """Purge the cached pages that render this product.
+
+    Counts and facets shown in every listing sidebar only move when the
+    category, availability, price or sizes change; other edits only touch the
+    product's own page, its category page, the full collection and possibly
+    the home page.
+    """
+    loaded = loaded or {}
+    slugs = {product.slug, loaded.get('slug')}
+    category_ids = {product.category_id, loaded.get('category_id')}
+    tags = ['product:%s' % slug for slug in slugs if slug]
+    tags += ['category:%s' % slug for slug in Category.objects.filter(
+        pk__in=[pk for pk in category_ids if pk]
+    ).values_list('slug', flat=True)]
+    tags.append('all-products')
+    if listings_changed:
+        tags.append('listings')
+    if listings_changed or product.featured or loaded.get('featured') or product.is_new_arrival:
+        tags.append('home')
+    page_cache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Category)
+def update_search_index_on_category_save(sender, instance, created, raw=False, **kwargs):
+    """Category names are indexed with each product, so renames must be propagated"""
+    if not raw and not created:
+        search.rename_category(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_pages_on_category_change(sender, instance, **kwargs):
+    """Categories appear in the navigation of every page"""
+    page_cache.invalidate('site')
+
+
+def _line_price(item):
+    if CartItem.product.is_cached(item):
+        return item.product.price
+    return Product.objects.values_list('price', flat=True).get(pk=item.product_id)
+
+
+def _adjust_cart_totals(item, quantity_delta):
+    """Shift the cart's stored totals by one line's change, in the database and on a loaded cart"""
+    if not quantity_delta:
+        return
+    amount_delta = quantity_delta * _line_price(item)
+    carts = Cart.objects.filter(pk=item.cart_id)
+    if quantity_delta < 0:
+        carts = carts.filter(item_count__gte=-quantity_delta)
+    updated = carts.update(
+        item_count=F('item_count') + quantity_delta,
+        subtotal=F('subtotal') + amount_delta,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        # Stored totals had drifted below this line; recount the cart instead
+        Cart.refresh_totals(Cart.objects.filter(pk=item.cart_id))
+        if CartItem.cart.is_cached(item):
+            item.cart.refresh_from_db(fields=['item_count', 'subtotal'])
+            remember_cart_count(item.cart)
+        return
+    if CartItem.cart.is_cached(item):
+        # Lets the cart views answer with the new totals without re-reading the row
+        item.cart.item_count += quantity_delta
+        item.cart.subtotal += amount_delta
+        remember_cart_count(item.cart)
+    else:
+        owner = Cart.objects.filter(pk=item.cart_id).values_list('user_id', 'session_key').first()
+        if owner:
+            forget_cart_count(*owner)
+
+
+@receiver(post_save, sender=CartItem)
+def update_cart_totals_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep Cart.item_count and Cart.subtotal in step with each line change"""
+    if raw or totals_suspended():
+        return
+    loaded = None if created else getattr(instance, '_loaded_values', None)
+    if created:
+        _adjust_cart_totals(instance, instance.quantity)
+    elif loaded is None or loaded.get('cart_id') != instance.cart_id or loaded.get('product_id') != instance.product_id:
+        # Cannot diff this save; recount every cart it may have touched
+        cart_ids = {instance.cart_id, (loaded or {}).get('cart_id')} - {None}
+        Cart.refresh_totals(Cart.objects.filter(pk__in=cart_ids))
+        if CartItem.cart.is_cached(instance):
+            instance.cart.refresh_from_db(fields=['item_count', 'subtotal'])
+            remember_cart_count(instance.cart)
+    else:
+        _adjust_cart_totals(instance, instance.quantity - loaded['quantity'])
+    instance._loaded_values = {
+        field.attname: getattr(instance, field.attname) for field in CartItem._meta.concrete_fields
+    }
+
+
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals_on_delete(sender, instance, **kwargs):
+    if totals_suspended():
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    _adjust_cart_totals(instance, -loaded.get('quantity', instance.quantity))
+
+
+@receiver(tasks.order_placed, sender=Order)
+def refresh_recommendations_on_order(sender, order, **kwargs):
+    """Fold new orders into customers-also-bought; bursts of orders share one rebuild"""
+    tasks.enqueue('store.build_recommendations', unique=True)
+
+
+@receiver(tasks.order_placed, sender=Order)
+def roll_up_sales_on_order(sender, order, **kwargs):
+    """Fold new orders into the daily sales rollups; a waiting run picks up later orders too"""
+    tasks.enqueue('store.roll_up_sales', unique=True)
+
+
+def create_search_index(sender, **kwargs):
+    """post_migrate hook: make sure the FTS5 table exists after every migrate"""
+    search.create_index()
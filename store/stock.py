@@ -0,0 +1,128 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .locking import write_transaction
+from .models import CartItem, Product, StockReservation
+
+
+class OutOfStock(Exception):
+    """Some products in the cart do not have enough unreserved stock"""
+
+    def __init__(self, shortfalls):
+        # [(product, units still available)]
+        self.shortfalls = shortfalls
+        super().__init__(' '.join(
+            f"Only {available} left of {product.name}." if available else f"{product.name} is out of stock."
+            for product, available in shortfalls
+        ))
+
+
+def reservation_minutes():
+    return getattr(settings, 'STOCK_RESERVATION_MINUTES', 15)
+
+
+def _held_by_others(cart=None):
+    """Units of the outer product held by live reservations of other carts"""
+    holds = StockReservation.objects.filter(product=OuterRef('pk'), expires_at__gt=timezone.now())
+    if cart is not None:
+        holds = holds.exclude(cart=cart)
+    held = holds.values('product').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(held, output_field=IntegerField()), Value(0))
+
+
+def _needed(lines):
+    """Units per product; stock is kept per product, not per size"""
+    needed = defaultdict(int)
+    for line in lines:
+        needed[line.product_id] += line.quantity
+    return dict(sorted(needed.items()))
+
+
+def addable(cart, product):
+    """Units of a product the cart can still take: stock not held by other carts, less what it already has.
+
+    Advisory for add-to-cart; stock.commit is what guarantees nothing oversells.
+    """
+    if getattr(cart, 'is_guest', False):
+        # A guest cart holds nothing yet, so every live hold belongs to someone else
+        in_cart = sum(row[3] for row in cart.rows if row[1] == product.pk)
+        held = _held_by_others()
+    else:
+        in_cart = CartItem.objects.filter(cart=cart, product=product).aggregate(units=Sum('quantity'))['units'] or 0
+        held = _held_by_others(cart)
+    stock_quantity, held = Product.objects.filter(pk=product.pk).annotate(held=held).values_list(
+        'stock_quantity', 'held',
+    ).get()
+    return max(stock_quantity - held - in_cart, 0)
+
+
+def reserve(cart, lines):
+    """Hold stock for a cart's lines until the order is placed or the hold expires.
+
+    Only the cart's product rows are locked, in pk order so concurrent
+    checkouts cannot deadlock; the cart's earlier hold is replaced. A live
+    hold that already covers exactly these lines is kept with its original
+    expiry, so reloading checkout does not extend it. Raises OutOfStock
+    without holding anything if a product falls short.
+    """
+    needed = _needed(lines)
+    if not needed:
+        return
+    live = StockReservation.objects.filter(cart=cart, expires_at__gt=timezone.now())
+    if dict(live.values_list('product_id', 'quantity')) == needed:
+        return
+    with write_transaction():
+        products = Product.objects.select_for_update().filter(pk__in=needed).order_by('pk').annotate(
+            held=_held_by_others(cart),
+        ).only('pk', 'name', 'stock_quantity')
+        shortfalls = [
+            (product, max(product.stock_quantity - product.held, 0))
+            for product in products if product.stock_quantity - product.held < needed[product.pk]
+        ]
+        if shortfalls:
+            raise OutOfStock(shortfalls)
+        StockReservation.objects.filter(cart=cart).delete()
+        expires_at = timezone.now() + timedelta(minutes=reservation_minutes())
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, cart=cart, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in needed.items()
+        ])
+
+
+def commit(cart, lines):
+    """Take the ordered units out of stock; call inside the order's transaction.
+
+    One conditional UPDATE decrements every product in the order, and only
+    rows whose stock not held by other carts still covers the order are
+    touched, so concurrent orders can never drive stock below what was sold.
+    The cart's own hold is consumed. Raises OutOfStock, leaving the caller to
+    roll back.
+    """
+    needed = _needed(lines)
+    ordered = Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in needed.items()],
+                   output_field=IntegerField())
+    now = timezone.now()
+    sold = Product.objects.filter(pk__in=needed, stock_quantity__gte=_held_by_others(cart) + ordered).update(
+        stock_quantity=F('stock_quantity') - ordered, updated_at=now,
+    )
+    if sold < len(needed):
+        # Rows that were decremented carry this call's timestamp
+        products = Product.objects.filter(pk__in=needed).exclude(updated_at=now).annotate(held=_held_by_others(cart))
+        raise OutOfStock([(product, max(product.stock_quantity - product.held, 0)) for product in products])
+    StockReservation.objects.filter(cart=cart).delete()
+
+
+def purge_expired(chunk_size=1000):
+    """Delete expired holds; they stopped counting against stock when they expired"""
+    deleted = 0
+    while True:
+        expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+        ids = list(expired.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += StockReservation.objects.filter(pk__in=ids).delete()[0]
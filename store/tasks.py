@@ -0,0 +1,265 @@
+"""A durable task queue kept in the database, so follow-up work needs no broker.
+
+Tasks are rows written inside the caller's transaction: a task enqueued
+while placing an order only becomes visible to workers if the order
+commits. `manage.py run_tasks` claims due tasks and runs them in a pool of
+threads or processes; failures are retried with exponential backoff.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Task
+from .locking import write_transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60 * 60
+# A task running longer than this is assumed to belong to a dead worker
+LOCK_TIMEOUT = 10 * 60
+RETENTION_DAYS = 7
+
+# Sent by the worker once an order has committed; receivers run off the request path
+order_placed = Signal()
+
+_registry = {}
+
+# name -> seconds between runs, for tasks that reschedule themselves
+_periodic = {}
+
+
+def task(name, max_attempts=MAX_ATTEMPTS, every=None):
+    """Register a function as a task handler; it is called with the payload as keyword arguments.
+
+    With `every` (seconds) the task recurs: run_tasks queues it when it
+    starts, and each run queues the next one when it finishes.
+    """
+    def register(func):
+        _registry[name] = (func, max_attempts)
+        if every:
+            _periodic[name] = every
+        return func
+    return register
+
+
+# Runs tasks when TASK_QUEUE_ASYNC is off: one thread, so jobs take turns
+# for the database like a single worker, and never in the request itself
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-background')
+
+
+def _run_in_background(name, payload):
+    """Run a task once in the background thread; failures are logged, not retried"""
+    try:
+        _registry[name][0](**payload)
+    except Exception:
+        logger.exception("Task %s failed in the background thread", name)
+    finally:
+        connection.close()
+
+
+def enqueue(name, payload=None, delay=0, unique=False):
+    """Queue a task, inside the current transaction if there is one.
+
+    With unique=True nothing is queued while a task of the same name is
+    still waiting, which coalesces bursts of refresh requests.
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown task {name!r}")
+    if not getattr(settings, 'TASK_QUEUE_ASYNC', True):
+        transaction.on_commit(lambda: _background.submit(_run_in_background, name, payload or {}))
+        return None
+    if unique and Task.objects.filter(name=name, status=Task.QUEUED).exists():
+        return None
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=_registry[name][1],
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def _schedule(name, delay):
+    """Queue the next run of a recurring task unless one is already waiting or running"""
+    with write_transaction():
+        if Task.objects.filter(name=name, status__in=[Task.QUEUED, Task.RUNNING]).exists():
+            return None
+        return Task.objects.create(
+            name=name, max_attempts=_registry[name][1], run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+
+def schedule_periodic():
+    """Make sure every recurring task has a run queued; returns the tasks created"""
+    return [task_row for name in _periodic if (task_row := _schedule(name, 0)) is not None]
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, with jitter so retries spread out"""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 10)
+
+
+def _recover_stale(now):
+    Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=LOCK_TIMEOUT)).update(
+        status=Task.QUEUED, locked_by='', locked_at=None,
+    )
+
+
+def claim(worker_id, limit=1):
+    """Mark up to `limit` due tasks as running for this worker and return them"""
+    now = timezone.now()
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with write_transaction():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=skip_locked)
+            .filter(status=Task.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        return list(Task.objects.filter(pk__in=ids).order_by('run_at', 'pk'))
+
+
+def run(task_row):
+    """Run one claimed task and record the outcome; returns True on success"""
+    entry = _registry.get(task_row.name)
+    try:
+        if entry is None:
+            raise KeyError(f"Unknown task {task_row.name!r}")
+        entry[0](**task_row.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Task %s failed (attempt %s of %s)", task_row, task_row.attempts, task_row.max_attempts)
+        retry = entry is not None and task_row.attempts < task_row.max_attempts
+        Task.objects.filter(pk=task_row.pk).update(
+            status=Task.QUEUED if retry else Task.FAILED,
+            run_at=timezone.now() + timedelta(seconds=backoff(task_row.attempts)) if retry else task_row.run_at,
+            last_error=error,
+            locked_by='',
+            locked_at=None,
+            finished_at=None if retry else timezone.now(),
+        )
+        if not retry and task_row.name in _periodic:
+            _schedule(task_row.name, _periodic[task_row.name])
+        return False
+    Task.objects.filter(pk=task_row.pk).update(
+        status=Task.DONE, locked_by='', locked_at=None, finished_at=timezone.now(),
+    )
+    if task_row.name in _periodic:
+        _schedule(task_row.name, _periodic[task_row.name])
+    return True
+
+
+def purge_finished(days=RETENTION_DAYS):
+    """Delete tasks that succeeded more than `days` ago; failed ones are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def work(worker_id, once=False, poll_interval=1.0, stop=None):
+    """Claim and run tasks until stopped; with once=True, until none are due.
+
+    Returns (succeeded, failed) counts.
+    """
+    succeeded = failed = 0
+    last_recovery = 0
+    try:
+        while stop is None or not stop.is_set():
+            close_old_connections()
+            if time.monotonic() - last_recovery > 60:
+                _recover_stale(timezone.now())
+                last_recovery = time.monotonic()
+            claimed = claim(worker_id)
+            if not claimed:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            for task_row in claimed:
+                if run(task_row):
+                    succeeded += 1
+                else:
+                    failed += 1
+    finally:
+        connections.close_all()
+    return succeeded, failed
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def run_workers(workers=2, processes=False, once=False, poll_interval=1.0, stop=None):
+    """Run `workers` worker loops in threads or processes; returns total (succeeded, failed)"""
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    if processes:
+        # Children open their own connections; inherited sockets must not be shared
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        futures = [pool.submit(work, f"{prefix}:p{i}", once, poll_interval) for i in range(workers)]
+    else:
+        stop = stop or threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task-worker')
+        futures = [pool.submit(work, f"{prefix}:t{i}", once, poll_interval, stop) for i in range(workers)]
+    try:
+        results = [future.result() for future in futures]
+    except KeyboardInterrupt:
+        if stop is not None:
+            stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+# Store tasks
+
+@task('store.order_placed')
+def handle_order_placed(order_id):
+    """Fan an order out to the order_placed receivers, in the worker rather than the checkout request"""
+    from .models import Order
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is not None:
+        order_placed.send(sender=Order, order=order)
+
+
+@task('store.build_recommendations')
+def build_recommendations():
+    from . import recommendations
+
+    recommendations.build()
+
+
+@task('store.roll_up_sales')
+def roll_up_sales():
+    from . import sales
+
+    sales.roll_up()
+
+
+@task('store.purge_abandoned_carts', every=24 * 60 * 60)
+def purge_abandoned_carts():
+    from . import purge
+
+    # Short pauses between chunks let checkouts take the write lock
+    purge.purge_abandoned(pause=0.05)
@@ -8,15 +8,19 @@ urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     path('products/', views.ProductListView.as_view(), name='product_list'),
     path('category/<slug:slug>/', views.CategoryProductsView.as_view(), name='category_products'),
+    path('new-arrivals/', views.NewArrivalsView.as_view(), name='new_arrivals'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('product/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('about/', views.about_view, name='about'),
     path('contact/', views.contact_view, name='contact'),
+    path('export/catalog/', views.catalog_export, name='catalog_export'),
     
     # Cart URLs
     path('cart/', views.cart_view, name='cart'),
     path('add-to-cart/', views.add_to_cart, name='add_to_cart'),
     path('update-cart-item/', views.update_cart_item, name='update_cart_item'),
     path('remove-from-cart/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     
     # Wishlist URLs
     path('wishlist/', views.wishlist_view, name='wishlist'),
@@ -1,42 +1,44 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.views.generic import ListView, DetailView
-from django.http import Http404, JsonResponse
+from django.utils.functional import cached_property
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from .models import Product, Category, Cart, CartItem, Wishlist, WishlistItem, Order, OrderItem
+from .models import Product, Category, Cart, CartItem, OrderItem, Wishlist, WishlistItem
 import json
+import uuid
 from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from .forms import UserRegistrationForm
+from .cart import CartOperationError, add_item, apply_operations, get_cart_count, remember_cart_count
+from .page_cache import cache_anonymous_page
+from .conditional import conditional_page, listing_etag, listing_last_modified, product_etag, product_last_modified
+from .search import SearchResults
+from .cards import product_image, render_product_cards
+from .session_merge import merge_guest_cart, merge_session_data
+from .recommendations import recommended_products
+from . import checkout, export, facets, guest_cart, stock
+from .pagination import InvalidCursor, KeysetPaginator
 
 class BaseView:
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs) if hasattr(super(), 'get_context_data') else {}
-        context['categories'] = Category.objects.all().order_by('name')
+        context['categories'] = list(Category.objects.all().order_by('name'))
         
         # Add cart count to context
-        cart_count = 0
-        if hasattr(self.request, 'user') and self.request.user.is_authenticated:
-            try:
-                cart = Cart.objects.get(user=self.request.user)
-                cart_count = cart.total_items
-            except Cart.DoesNotExist:
-                pass
-        else:
-            session_key = self.request.session.session_key
-            if session_key:
-                try:
-                    cart = Cart.objects.get(session_key=session_key)
-                    cart_count = cart.total_items
-                except Cart.DoesNotExist:
-                    pass
-        
-        context['cart_count'] = cart_count
+        context['cart_count'] = get_cart_count(self.request)
         return context
 
+@method_decorator(conditional_page(listing_etag, listing_last_modified), name='dispatch')
+@method_decorator(cache_anonymous_page('site', 'home'), name='dispatch')
 class HomeView(BaseView, ListView):
     model = Product
     template_name = 'store/home.html'
@@ -47,24 +49,101 @@ class HomeView(BaseView, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['new_arrivals'] = Product.objects.filter(available=True).order_by('-created_at')[:4]
+        context['new_arrivals'] = Product.objects.filter(available=True).new_arrivals().select_related(
+            'category'
+        ).order_by('-created_at', '-id')[:4]
+        return context
+
+class ProductCardsMixin:
+    """Expose the current page's products as pre-rendered, cached card HTML"""
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['product_cards'] = render_product_cards(context['products'])
         return context
 
-class ProductListView(BaseView, ListView):
+class CursorPaginationMixin:
+    """Keyset pagination on (created_at, id); ?page=N keeps the OFFSET paginator for old links"""
+    
+    def get_listing_count(self):
+        return None
+    
+    def paginate_queryset(self, queryset, page_size):
+        if 'page' in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, count=self.get_listing_count)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return paginator, page, page.object_list, page.has_other_pages()
+
+class FacetFilterMixin:
+    """Size and price band filtering, with counts read from the facet index"""
+    category = None
+    
+    def get_facet_selection(self):
+        size = self.request.GET.get('size', '').strip()
+        price_band = self.request.GET.get('price', '').strip()
+        if price_band not in facets.PRICE_BAND_SLUGS:
+            price_band = ''
+        return size, price_band
+    
+    def filter_by_facets(self, queryset):
+        self.selected_size, self.selected_price = self.get_facet_selection()
+        return facets.filter_products(queryset, self.selected_size, self.selected_price)
+    
+    @cached_property
+    def facet_counts(self):
+        return facets.FacetCounts()
+    
+    def get_listing_count(self):
+        """Exact size of the filtered listing, read from the facet index instead of COUNT(*)"""
+        per_category = self.facet_counts.categories(price_band=self.selected_price, size=self.selected_size)
+        if self.category:
+            return per_category.get(self.category.pk, 0)
+        return sum(per_category.values())
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        size, price_band = self.selected_size, self.selected_price
+        categories = context['categories']
+        category_id = self.category.pk if self.category else None
+        counts = self.facet_counts
+        
+        if size or price_band:
+            per_category = counts.categories(price_band=price_band, size=size)
+            context['category_facets'] = [(c, per_category.get(c.pk, 0)) for c in categories]
+        else:
+            context['category_facets'] = [(c, c.product_count) for c in categories]
+        context['total_products'] = sum(count for _category, count in context['category_facets'])
+        context['size_facets'] = [
+            {'value': value, 'count': count, 'selected': value == size}
+            for value, count in counts.sizes(category_id, price_band)
+        ]
+        context['price_facets'] = [
+            {'value': value, 'label': label, 'count': count, 'selected': value == price_band}
+            for value, label, count in counts.price_bands(category_id, size)
+        ]
+        context['facets_active'] = bool(size or price_band)
+        return context
+
+@method_decorator(conditional_page(listing_etag, listing_last_modified), name='dispatch')
+@method_decorator(cache_anonymous_page('site', 'listings', 'all-products'), name='dispatch')
+class ProductListView(ProductCardsMixin, FacetFilterMixin, CursorPaginationMixin, BaseView, ListView):
     model = Product
     template_name = 'store/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
     
     def get_queryset(self):
-        return Product.objects.filter(available=True)
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['total_products'] = Product.objects.filter(available=True).count()
-        return context
+        return self.filter_by_facets(
+            Product.objects.filter(available=True).select_related('category').with_new_arrival_flag()
+        )
 
-class CategoryProductsView(BaseView, ListView):
+@method_decorator(conditional_page(listing_etag, listing_last_modified), name='dispatch')
+@method_decorator(cache_anonymous_page('site', 'listings', 'category:{slug}'), name='dispatch')
+class CategoryProductsView(ProductCardsMixin, FacetFilterMixin, CursorPaginationMixin, BaseView, ListView):
     model = Product
     template_name = 'store/product_list.html'
     context_object_name = 'products'
@@ -73,7 +152,10 @@ class CategoryProductsView(BaseView, ListView):
     def get_queryset(self):
         try:
             self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-            return Product.objects.filter(category=self.category, available=True)
+            queryset = Product.objects.filter(
+                category=self.category, available=True
+            ).select_related('category').with_new_arrival_flag()
+            return self.filter_by_facets(queryset)
         except Http404:
             print(f"Category not found: {self.kwargs['slug']}")
             print(f"Available categories: {list(Category.objects.values_list('slug', flat=True))}")
@@ -82,27 +164,103 @@ class CategoryProductsView(BaseView, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['current_category'] = self.category
-        context['total_products'] = Product.objects.filter(available=True).count()
         return context
 
+@method_decorator(conditional_page(listing_etag, listing_last_modified), name='dispatch')
+@method_decorator(cache_anonymous_page('site', 'listings'), name='dispatch')
+class NewArrivalsView(ProductCardsMixin, CursorPaginationMixin, BaseView, ListView):
+    """Everything added inside the NEW_ARRIVAL_DAYS window, newest first"""
+    template_name = 'store/product_list.html'
+    context_object_name = 'products'
+    paginate_by = 12
+    
+    def get_queryset(self):
+        return Product.objects.filter(available=True).new_arrivals().select_related('category').with_new_arrival_flag()
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['new_arrivals_page'] = True
+        context['category_facets'] = [(c, c.product_count) for c in context['categories']]
+        context['total_products'] = sum(c.product_count for c in context['categories'])
+        return context
+
+class SearchView(ProductCardsMixin, BaseView, ListView):
+    template_name = 'store/product_list.html'
+    context_object_name = 'products'
+    paginate_by = 12
+    
+    def get_queryset(self):
+        self.search_query = self.request.GET.get('q', '').strip()
+        return SearchResults(self.search_query)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_query'] = self.search_query
+        context['category_facets'] = [(c, c.product_count) for c in context['categories']]
+        context['total_products'] = sum(c.product_count for c in context['categories'])
+        return context
+
+@method_decorator(conditional_page(product_etag, product_last_modified), name='dispatch')
+@method_decorator(cache_anonymous_page('site', 'product:{slug}', 'listings', 'recommendations'), name='dispatch')
 class ProductDetailView(BaseView, DetailView):
     model = Product
     template_name = 'store/product_detail.html'
     context_object_name = 'product'
     
     def get_queryset(self):
-        return Product.objects.filter(available=True)
+        return Product.objects.filter(available=True).select_related('category').with_new_arrival_flag()
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['product_image'] = product_image(self.object, 'detail')
+        context['recommended_cards'] = render_product_cards(recommended_products(self.object))
+        return context
 
+@cache_anonymous_page('site')
 def about_view(request):
     categories = Category.objects.all().order_by('name')
     return render(request, 'store/about.html', {'categories': categories})
 
+@cache_anonymous_page('site')
 def contact_view(request):
     categories = Category.objects.all().order_by('name')
     return render(request, 'store/contact.html', {'categories': categories})
 
+@require_GET
+def catalog_export(request):
+    """Stream the catalog as NDJSON or CSV; ?since=<ISO datetime> returns only rows changed after it"""
+    if not export.authorized(request):
+        # Partners only: every hit is a full catalog scan
+        response = HttpResponse("A partner token or staff login is required", status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer realm="catalog-export"'
+        return response
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in export.FORMATS:
+        return HttpResponseBadRequest("format must be one of: %s" % ', '.join(export.FORMATS))
+    
+    since = request.GET.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return HttpResponseBadRequest("since must be an ISO 8601 datetime")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    
+    until = export.export_window(since or None)
+    rows = export.export_rows(since or None, until, base_url=request.build_absolute_uri('/').rstrip('/'))
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export.render_lines(rows, export_format), content_type=content_type + '; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="catalog.%s"' % export_format
+    # Pass this back as ?since= on the next run to fetch only the delta
+    if until:
+        response['X-Export-Until'] = until.isoformat()
+    return response
+
 def get_or_create_cart(request):
     """Get or create cart for user or session"""
+    if not request.user.is_authenticated and guest_cart.enabled():
+        # Kept in the cache or a cookie until the visitor logs in
+        return guest_cart.load(request)
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
     else:
@@ -122,9 +280,8 @@ def get_or_create_wishlist(request):
     return wishlist
 
 @require_POST
-@login_required
 def add_to_cart(request):
-    """Add product to cart via AJAX"""
+    """Add product to cart via AJAX; guests' lines go to the configured guest cart engine"""
     try:
         # Handle both JSON and form data
         if request.content_type == 'application/json':
@@ -143,20 +300,24 @@ def add_to_cart(request):
                 'message': 'Product ID is required'
             })
         
+        if quantity < 1:
+            return JsonResponse({
+                'success': False,
+                'message': 'Quantity must be at least 1'
+            })
+        
         product = get_object_or_404(Product, id=product_id, available=True)
         cart = get_or_create_cart(request)
+        # Counts what the cart already has and what other carts are holding at checkout
+        remaining = stock.addable(cart, product)
+        if quantity > remaining:
+            return JsonResponse({
+                'success': False,
+                'message': f'Only {remaining} more of {product.name} can be added.' if remaining else f'No more of {product.name} is available.'
+            })
         
-        # Check if item already exists in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            size=size,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        # Upsert with a database-side increment so concurrent adds are never lost
+        add_item(cart, product, quantity, size)
         
         return JsonResponse({
             'success': True,
@@ -224,6 +385,11 @@ def cart_view(request):
     """Display cart contents"""
     cart = get_or_create_cart(request)
     categories = Category.objects.all().order_by('name')
+    if not getattr(cart, 'is_guest', False):
+        # The template walks cart.items.all twice and prices every line
+        prefetch_related_objects([cart], Prefetch('items', queryset=CartItem.objects.select_related('product')))
+    # Re-sync the header badge with the cart we just read
+    remember_cart_count(cart)
     
     context = {
         'cart': cart,
@@ -252,13 +418,25 @@ def update_cart_item(request):
             })
         
         cart = get_or_create_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        if getattr(cart, 'is_guest', False):
+            cart, lines = apply_operations(cart, [{'op': 'set', 'item_id': item_id, 'quantity': max(quantity, 0)}])
+            cart_item = next((line for line in lines if line.pk == int(item_id)), None)
+            return JsonResponse({
+                'success': True,
+                'cart_count': cart.total_items,
+                'cart_total': float(cart.total_price),
+                'item_total': float(cart_item.get_total_price()) if cart_item else 0
+            })
         
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
+        cart_item = get_object_or_404(CartItem.objects.select_related('product'), id=item_id, cart=cart)
+        cart_item.cart = cart
+        
+        with transaction.atomic():
+            if quantity > 0:
+                cart_item.quantity = quantity
+                cart_item.save()
+            else:
+                cart_item.delete()
         
         return JsonResponse({
             'success': True,
@@ -292,8 +470,12 @@ def remove_from_cart(request):
             })
         
         cart = get_or_create_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        cart_item.delete()
+        if getattr(cart, 'is_guest', False):
+            cart, _lines = apply_operations(cart, [{'op': 'remove', 'item_id': item_id}])
+        else:
+            cart_item = get_object_or_404(CartItem.objects.select_related('product'), id=item_id, cart=cart)
+            cart_item.cart = cart
+            cart_item.delete()
         
         return JsonResponse({
             'success': True,
@@ -302,7 +484,7 @@ def remove_from_cart(request):
             'cart_total': float(cart.total_price)
         })
         
-    except CartItem.DoesNotExist:
+    except (CartItem.DoesNotExist, CartOperationError):
         return JsonResponse({
             'success': False,
             'message': 'Item not found in cart'
@@ -314,6 +496,48 @@ def remove_from_cart(request):
             'message': 'Error removing item from cart. Please try again.'
         })
 
+@require_POST
+def cart_batch(request):
+    """Apply several cart operations in one request and return the resulting cart.
+
+    Expects a JSON body {"operations": [...]} where each operation is one of
+    {"op": "add", "product_id", "quantity", "size"}, {"op": "set", "item_id", "quantity"},
+    {"op": "remove", "item_id"} or {"op": "size", "item_id", "size"}. Either every
+    operation is applied or none is.
+    """
+    try:
+        operations = json.loads(request.body).get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Expected a JSON object with an operations list'
+        }, status=400)
+    
+    cart = get_or_create_cart(request)
+    try:
+        cart, lines = apply_operations(cart, operations)
+    except CartOperationError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e),
+            'operation': e.index
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'items': [{
+            'item_id': line.pk,
+            'product_id': line.product_id,
+            'name': line.product.name,
+            'size': line.size,
+            'quantity': line.quantity,
+            'price': float(line.product.price),
+            'item_total': float(line.get_total_price())
+        } for line in lines],
+        'cart_count': cart.total_items,
+        'cart_total': float(cart.total_price)
+    })
+
 def wishlist_view(request):
     """Display wishlist contents"""
     wishlist = get_or_create_wishlist(request)
@@ -322,53 +546,26 @@ def wishlist_view(request):
     context = {
         'wishlist': wishlist,
         'categories': categories,
-        'cart_count': get_or_create_cart(request).total_items
+        'cart_count': get_cart_count(request)
     }
     return render(request, 'store/wishlist.html', context)
 
 
-def checkout_view(request):
-    cart = get_or_create_cart(request)
-    if not cart.items.exists():
-        messages.error(request, "Your cart is empty.")
-        return redirect('store:cart_view')
-    if request.method == 'POST':
-        # Collect form data
-        full_name = request.POST.get('full_name')
-        address = request.POST.get('address')
-        city = request.POST.get('city')
-        postal_code = request.POST.get('postal_code')
-        phone = request.POST.get('phone')
-        payment_method = request.POST.get('payment_method')
-        # Save order summary in session (for demo)
-        request.session['order_summary'] = {
-            'full_name': full_name,
-            'address': address,
-            'city': city,
-            'postal_code': postal_code,
-            'phone': phone,
-            'payment_method': payment_method,
-            'items': [
-                {
-                    'name': item.product.name,
-                    'quantity': item.quantity,
-                    'size': item.size,
-                    'total': float(item.get_total_price())
-                } for item in cart.items.all()
-            ],
-            'total_price': float(cart.total_price)
-        }
-        # Clear cart
-        cart.items.all().delete()
-        return redirect(reverse('store:order_success'))
-    return render(request, 'store/checkout.html', {'cart': cart})
-
 def order_success(request):
     order_summary = request.session.get('order_summary')
     if not order_summary:
         return redirect('store:product_list')
     return render(request, 'store/order_success.html', {'order': order_summary})
 
+def _login_and_merge(request, user):
+    """Log the user in and keep the cart and wishlist they built as a guest"""
+    # login() rotates the session key, so read it first
+    session_key = request.session.session_key
+    login(request, user)
+    merge_session_data(session_key, user)
+    merge_guest_cart(request, user)
+
+
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('store:home')
@@ -377,7 +574,7 @@ def login_view(request):
         login_form = AuthenticationForm(request, data=request.POST)
         if login_form.is_valid():
             user = login_form.get_user()
-            login(request, user)
+            _login_and_merge(request, user)
             return redirect('store:home')
         else:
             messages.error(request, 'Invalid username or password.')
@@ -403,7 +600,7 @@ def register_view(request):
     if request.method == 'POST':
         if register_form.is_valid():
             user = register_form.save()
-            login(request, user)
+            _login_and_merge(request, user)
             return redirect('store:home')
         else:
             messages.error(request, "Please fix the errors in the form.")  # ✅ Show error popup
@@ -416,67 +613,53 @@ def logout_view(request):
     logout(request)
     return redirect('store:home')
 
+ORDERS_PER_PAGE = 10
+
 @login_required
 def profile_view(request):
+    """Order history, one keyset page at a time with the page's lines and products in one query"""
     user = request.user
-    orders = user.orders.all().order_by('-created_at')
-    return render(request, 'store/profile.html', {'user': user, 'orders': orders})
+    paginator = KeysetPaginator(user.orders.all(), ORDERS_PER_PAGE, count=user.orders.count)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404("Invalid cursor")
+    prefetch_related_objects(page.object_list, Prefetch(
+        'items', queryset=OrderItem.objects.select_related('product').order_by('pk'),
+    ))
+    return render(request, 'store/profile.html', {
+        'user': user,
+        'orders': page.object_list,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+    })
 
 
+@login_required
 def checkout_view(request):
     cart = get_or_create_cart(request)
-    if not cart.items.exists():
-        messages.error(request, "Your cart is empty.")
-        return redirect('store:cart_view')
     if request.method == 'POST':
-        # Collect form data
-        full_name = request.POST.get('full_name')
-        address = request.POST.get('address')
-        city = request.POST.get('city')
-        postal_code = request.POST.get('postal_code')
-        phone = request.POST.get('phone')
-        payment_method = request.POST.get('payment_method')
-        # Save order to DB
-        order = Order.objects.create(
-            user=request.user,
-            full_name=full_name,
-            address=address,
-            city=city,
-            postal_code=postal_code,
-            phone=phone,
-            payment_method=payment_method,
-            total_price=cart.total_price
-        )
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                size=item.size,
-                total=item.get_total_price()
-            )
-        # Save order summary in session (optional, for order_success page)
-        request.session['order_summary'] = {
-            'order_id': order.id,
-            'full_name': full_name,
-            'address': address,
-            'city': city,
-            'postal_code': postal_code,
-            'phone': phone,
-            'payment_method': payment_method,
-            'items': [
-                {
-                    'name': item.product.name,
-                    'quantity': item.quantity,
-                    'size': item.size,
-                    'total': float(item.get_total_price())
-                } for item in cart.items.all()
-            ],
-            'total_price': float(cart.total_price)
-        }
-        # Clear cart
-        cart.items.all().delete()
+        # The form carries a key minted when it was rendered, so a double
+        # submit or a retried request returns the order already placed
+        idempotency_key = request.POST.get('idempotency_key') or uuid.uuid4().hex
+        try:
+            order, items, _created = checkout.place_order(request.user, cart, request.POST, idempotency_key[:64])
+        except checkout.CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('store:cart')
+        request.session['order_summary'] = checkout.order_summary(order, items)
         return redirect(reverse('store:order_success'))
-    return render(request, 'store/checkout.html', {'cart': cart})
+    
+    if not cart.total_items:
+        messages.error(request, "Your cart is empty.")
+        return redirect('store:cart')
+    prefetch_related_objects([cart], Prefetch('items', queryset=CartItem.objects.select_related('product')))
+    try:
+        # Hold the stock while the shopper fills in the form
+        stock.reserve(cart, cart.items.all())
+    except stock.OutOfStock as e:
+        messages.error(request, str(e))
+        return redirect('store:cart')
+    return render(request, 'store/checkout.html', {'cart': cart, 'idempotency_key': uuid.uuid4().hex})
 
 